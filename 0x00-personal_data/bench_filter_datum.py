@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of filter_datum: lines per second of the cached
+redaction engines, through filter_datum and called directly as
+RedactingFormatter does, against the original re.sub on every call.
+
+Usage: ./bench_filter_datum.py [-n LINES] [-r REPEAT] [--csv user_data.csv]
+"""
+
+import argparse
+import csv
+import re
+import time
+from itertools import cycle, islice
+from typing import Callable, List
+
+from filtered_logger import PII_FIELDS, filter_datum, get_engine, rgx
+
+
+def original_filter_datum(fields: List[str], redaction: str, message: str,
+                          separator: str) -> str:
+    """ filter_datum as it was before the engines: the pattern is built
+    and compiled again on every call """
+    extract, replace = (rgx["extract"], rgx["replace"])
+    return re.sub(extract(fields, separator), replace(redaction), message)
+
+
+def log_lines(path: str) -> List[str]:
+    """ The rows of a CSV file as user_data log lines """
+    with open(path, newline="") as f:
+        return ["".join("{}={};".format(key, value)
+                        for key, value in row.items())
+                for row in csv.DictReader(f)]
+
+
+def lines_per_second(redact: Callable[[str], str], lines: List[str],
+                     count: int) -> float:
+    """ Throughput of a redaction function over count lines """
+    start = time.perf_counter()
+    for line in islice(cycle(lines), count):
+        redact(line)
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    """ Run the benchmark and print one line per implementation """
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument("-n", "--lines", type=int, default=100000,
+                        help="lines redacted per implementation")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="rounds, the best one is reported")
+    parser.add_argument("--csv", default="user_data.csv",
+                        help="CSV file the log lines are built from")
+    args = parser.parse_args()
+
+    fields = list(PII_FIELDS)
+    lines = log_lines(args.csv)
+    candidates = {
+        "re.sub per call": lambda line: original_filter_datum(
+            fields, "***", line, ";"),
+        "cached regex engine": lambda line: filter_datum(
+            fields, "***", line, ";"),
+        "cached scan engine": lambda line: filter_datum(
+            fields, "***", line, ";", mode="scan"),
+        "regex engine.redact": get_engine(fields, "***", ";").redact,
+        "scan engine.redact": get_engine(fields, "***", ";",
+                                         mode="scan").redact,
+    }
+    expected = [candidates["re.sub per call"](line) for line in lines]
+    for name, redact in candidates.items():
+        assert [redact(line) for line in lines] == expected, name
+
+    best = dict.fromkeys(candidates, 0.0)
+    for _ in range(args.repeat):
+        for name, redact in candidates.items():
+            best[name] = max(best[name],
+                             lines_per_second(redact, lines, args.lines))
+    print("{} lines from {}, {} fields redacted, best of {}".format(
+        args.lines, args.csv, len(fields), args.repeat))
+    for name, rate in best.items():
+        print("{:<22} {:>10,.0f} lines/s".format(name, rate))
+
+
+if __name__ == "__main__":
+    main()
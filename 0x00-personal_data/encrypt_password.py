@@ -3,20 +3,117 @@
 This module function returns the log message obfuscated
 """
 
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Iterable, List, Tuple, Union
+
 import bcrypt
 
 
-def hash_password(password: str) -> bytes:
+BCRYPT_ROUNDS = 12
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_MAX_ROUNDS = 31
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = BCRYPT_MIN_ROUNDS,
+                     max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """
+    Finds the highest bcrypt cost factor whose verify time on this host
+    stays within a latency budget.
+
+    Each extra round doubles the work, so rounds are timed upwards from
+    min_rounds until one goes over the budget.
+
+    Args:
+        target_ms (float): The verify time budget, in milliseconds.
+        min_rounds (int): The lowest cost factor to return.
+        max_rounds (int): The highest cost factor to return.
+
+    Returns:
+        int: The cost factor to hash new passwords with.
+    """
+    password = b"calibration"
+    rounds = min_rounds
+    while rounds < max_rounds:
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds + 1))
+        start = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+@lru_cache(maxsize=1)
+def default_rounds() -> int:
+    """
+    Returns the cost factor of new hashes: calibrated against
+    BCRYPT_TARGET_MS when it is set, else BCRYPT_ROUNDS from the
+    environment, else bcrypt's default. Calibration runs once, and
+    takes a while: servers should call this at startup rather than
+    leave it to the first login.
+    """
+    target_ms = os.getenv("BCRYPT_TARGET_MS")
+    if target_ms:
+        return calibrate_rounds(float(target_ms))
+    return int(os.getenv("BCRYPT_ROUNDS", BCRYPT_ROUNDS))
+
+
+def rounds_pinned() -> bool:
+    """
+    Tells whether the cost factor is pinned with BCRYPT_ROUNDS rather
+    than calibrated with BCRYPT_TARGET_MS.
+    """
+    return (not os.getenv("BCRYPT_TARGET_MS") and
+            os.getenv("BCRYPT_ROUNDS") is not None)
+
+
+def needs_rehash(hashed_password: Union[bytes, str],
+                 rounds: int = None) -> bool:
+    """
+    Tells whether a hash should be replaced on the next successful login.
+
+    A calibrated cost factor varies from host to host with timing noise,
+    so only hashes weaker than it are replaced; otherwise hashes would
+    flip between the costs of two hosts on every login. A cost factor
+    pinned with BCRYPT_ROUNDS, or passed as rounds, is enforced both
+    ways.
+
+    Args:
+        hashed_password (bytes): The hashed password.
+        rounds (int): The expected cost factor, defaults to
+        default_rounds().
+
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    try:
+        cost = int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return True
+    if rounds or rounds_pinned():
+        return cost != (rounds or default_rounds())
+    return cost < default_rounds()
+
+
+def hash_password(password: str, rounds: int = None) -> bytes:
     """
     Hashes a password using bcrypt with salt.
 
     Args:
         password (str): The password to hash.
+        rounds (int): The bcrypt cost factor, defaults to
+        default_rounds().
 
     Returns:
         bytes: The hashed password.
     """
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=rounds or default_rounds())
     hashed_password = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed_password
 
@@ -34,3 +131,75 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
         False otherwise.
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """ is_valid over a (hashed_password, password) pair """
+    return is_valid(*pair)
+
+
+class PasswordHasher:
+    """
+    Hashes and verifies passwords with bcrypt on a pool of workers.
+
+    bcrypt releases the GIL while hashing, so the default thread pool
+    already runs one hash per core; a process pool is available for
+    builds that do not.
+    """
+
+    def __init__(self, rounds: int = None, workers: int = None,
+                 processes: bool = False):
+        """
+        Args:
+            rounds (int): The bcrypt cost factor of new hashes, defaults
+            to default_rounds().
+            workers (int): Pool size, defaults to the number of cores.
+            processes (bool): Use a process pool instead of threads.
+        """
+        self.rounds = rounds or default_rounds()
+        self.workers = workers or os.cpu_count() or 1
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers)
+
+    def hash_many(self, passwords: Iterable[str]) -> List[bytes]:
+        """
+        Hashes passwords in parallel.
+
+        Returns:
+            list: The hashed passwords, in input order.
+        """
+        hash_one = partial(hash_password, rounds=self.rounds)
+        return list(self.executor.map(hash_one, passwords))
+
+    def verify_many(self, pairs: Iterable[Tuple[bytes, str]]) -> List[bool]:
+        """
+        Validates (hashed_password, password) pairs in parallel.
+
+        Returns:
+            list: One bool per pair, in input order.
+        """
+        return list(self.executor.map(_is_valid_pair, pairs))
+
+    async def hash(self, password: str) -> bytes:
+        """ Hashes a password without blocking the event loop """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, partial(hash_password, password, self.rounds))
+
+    async def verify(self, hashed_password: bytes, password: str) -> bool:
+        """ Validates a password without blocking the event loop """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, is_valid, hashed_password, password)
+
+    def close(self) -> None:
+        """ Shut the worker pool down """
+        self.executor.shutdown()
+
+    def __enter__(self) -> "PasswordHasher":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
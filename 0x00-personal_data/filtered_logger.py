@@ -3,10 +3,25 @@
 This module function returns the log message obfuscated
 """
 
+import argparse
+import atexit
+import copy
+import json
 import os
-from typing import List
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from itertools import islice
+from typing import (Any, Callable, Dict, Iterable, Iterator, List, Mapping,
+                    Optional, TextIO, Tuple)
 import logging
 from logging import StreamHandler
+from logging.handlers import QueueHandler, QueueListener
 import re
 import csv
 import mysql.connector
@@ -19,29 +34,291 @@ rgx = {
 }
 
 PII_FIELDS = ("name", "email", "phone", "ssn", "password")
+ENGINE_CACHE_SIZE = 128
+CHUNK_SIZE = 1024
 
+LOG_ASYNC = os.getenv("PERSONAL_DATA_LOG_ASYNC", "0").lower() in (
+    "1", "true", "yes")
+LOG_QUEUE_SIZE = int(os.getenv("PERSONAL_DATA_LOG_QUEUE_SIZE", 10000))
+LOG_OVERFLOW = os.getenv("PERSONAL_DATA_LOG_OVERFLOW", "block")
+LOG_JSON = os.getenv("PERSONAL_DATA_LOG_JSON", "0").lower() in (
+    "1", "true", "yes")
+_listener = None
 
-def get_logger() -> logging.Logger:
+DB_POOL_SIZE = 5
+DB_POOL_TIMEOUT = 30
+USERS_BATCH_SIZE = 1000
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class RedactionEngine:
+    """
+    Redacts fields of a log message with a pattern compiled once.
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """
+        Compile the extraction pattern for the given fields.
+
+        Args:
+            fields (tuple): Names of the fields to obfuscate.
+            redaction (str): Replacement for the obfuscated values.
+            separator (str): Character separating fields in a message.
+        """
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self.pattern = re.compile(rgx['extract'](fields, separator))
+        self.replacement = rgx['replace'](redaction)
+
+    def redact(self, message: str) -> str:
+        """
+        Obfuscate the engine fields in a message.
+
+        Args:
+            message (str): The log line to redact.
+
+        Returns:
+            str: The log line with the fields obfuscated.
+        """
+        return self.pattern.sub(self.replacement, message)
+
+
+class ScanRedactionEngine:
+    """
+    Redacts fields of a log message in a single pass over its
+    separators, without going through the regex engine.
+    """
+
+    def __init__(self, fields: Tuple[str, ...], redaction: str,
+                 separator: str):
+        """
+        Index the fields by length for the key lookups.
+
+        Args:
+            fields (tuple): Names of the fields to obfuscate.
+            redaction (str): Replacement for the obfuscated values.
+            separator (str): Character separating fields in a message.
+        """
+        self.fields = fields
+        self.redaction = redaction
+        self.separator = separator
+        self.field_set = frozenset(fields)
+        self.lengths = sorted({len(field) for field in fields},
+                              reverse=True)
+
+    @staticmethod
+    def supports(fields: Tuple[str, ...], redaction: str,
+                 separator: str) -> bool:
+        """
+        Tell whether the scan gives the same output as the regex.
+
+        Fields and separator must be literal text for the pattern
+        (no metacharacters, no "=" or separator in a field, a single
+        character separator other than "=") and the redaction must not
+        hold group references.
+        """
+        if len(separator) != 1 or re.escape(separator) != separator:
+            return False
+        if separator == '=':
+            return False
+        if not fields or '\\' in redaction:
+            return False
+        for field in fields:
+            if not field or re.escape(field) != field:
+                return False
+            if '=' in field or separator in field:
+                return False
+        return True
+
+    def _key_end(self, token: str) -> int:
+        """
+        Returns the index of the "=" ending the first field of a token,
+        or -1 when the token holds no field.
+
+        Like the regex, a field matches wherever it is directly followed
+        by "=", the leftmost (longest) field winning.
+        """
+        equal = token.find('=')
+        while equal != -1:
+            if token[:equal] in self.field_set:
+                return equal
+            for length in self.lengths:
+                if length < equal and \
+                        token[equal - length:equal] in self.field_set:
+                    return equal
+            equal = token.find('=', equal + 1)
+        return -1
+
+    def redact(self, message: str) -> str:
+        """
+        Obfuscate the engine fields in a message.
+
+        Args:
+            message (str): The log line to redact.
+
+        Returns:
+            str: The log line with the fields obfuscated.
+        """
+        tokens = message.split(self.separator)
+        for i, token in enumerate(tokens):
+            equal = self._key_end(token)
+            if equal != -1:
+                tokens[i] = token[:equal + 1] + self.redaction
+        return self.separator.join(tokens)
+
+
+@lru_cache(maxsize=ENGINE_CACHE_SIZE)
+def _cached_engine(fields: Tuple[str, ...], separator: str,
+                   redaction: str, mode: str) -> RedactionEngine:
+    """ Build an engine, memoized by (fields, separator, redaction) """
+    if mode == "scan":
+        if ScanRedactionEngine.supports(fields, redaction, separator):
+            return ScanRedactionEngine(fields, redaction, separator)
+    elif mode != "regex":
+        raise ValueError("unknown redaction mode: {}".format(mode))
+    return RedactionEngine(fields, redaction, separator)
+
+
+def get_engine(fields: List[str], redaction: str,
+               separator: str, mode: str = "regex") -> RedactionEngine:
+    """
+    Returns the redaction engine for a set of fields.
+
+    Engines are kept in a bounded LRU cache so the pattern is only
+    compiled the first time a (fields, separator, redaction) is seen.
+    The "scan" mode falls back to the regex engine for fields or
+    separators it cannot match literally.
+
+    Returns:
+        RedactionEngine: The compiled engine.
+    """
+    return _cached_engine(tuple(fields), separator, redaction, mode)
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    QueueHandler applying an overflow policy when its bounded queue
+    is full:
+        block: wait for the listener to make room
+        drop: discard the record
+        count: discard the record and report how many were lost when
+        the logger is stopped
+    """
+    POLICIES = ("block", "drop", "count")
+
+    def __init__(self, log_queue: queue.Queue, policy: str = "block"):
+        if policy not in self.POLICIES:
+            raise ValueError("unknown overflow policy: {}".format(policy))
+        super(BoundedQueueHandler, self).__init__(log_queue)
+        self.policy = policy
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        """ Queue a record according to the overflow policy """
+        if self.policy == "block":
+            self.queue.put(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """ Keep mapping messages as they are for the structured path """
+        if isinstance(record.msg, Mapping):
+            record = copy.copy(record)
+            record.exc_text = RedactingFormatter.exception_text(record)
+            record.exc_info = None
+            return record
+        return super(BoundedQueueHandler, self).prepare(record)
+
+
+class DrainingQueueListener(QueueListener):
+    """
+    QueueListener whose stop waits for room in a full queue, so the
+    records queued before it are always handled.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        """ Queue the stop marker behind the pending records """
+        self.queue.put(self._sentinel)
+
+
+def get_logger(async_mode: bool = None) -> logging.Logger:
     """
     Returns a logging.Logger object named "user_data".
 
+    In async mode records go through a bounded queue and are redacted
+    and written by a QueueListener thread, so callers never wait on
+    the formatter or on stderr. Calling it again returns the logger
+    as configured by the first call.
+
+    Args:
+        async_mode (bool): Log through a queue, defaults to the
+        PERSONAL_DATA_LOG_ASYNC environment variable.
+
     Returns:
         logging.Logger: Logger object for logging user data.
     """
+    global _listener
     logger = logging.getLogger("user_data")
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.INFO)
     logger.propagate = False
 
     handler = logging.StreamHandler()
-    formatter = RedactingFormatter()
+    formatter = RedactingFormatter(fields=PII_FIELDS, json_lines=LOG_JSON)
     handler.setFormatter(formatter)
+
+    if async_mode is None:
+        async_mode = LOG_ASYNC
+    if async_mode:
+        log_queue = queue.Queue(LOG_QUEUE_SIZE)
+        _listener = DrainingQueueListener(log_queue, handler,
+                                          respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logger)
+        handler = BoundedQueueHandler(log_queue, LOG_OVERFLOW)
     logger.addHandler(handler)
 
     return logger
 
 
+def stop_logger() -> None:
+    """
+    Flush and stop the async "user_data" logger, if one is running.
+
+    The records already queued are written before it returns. A later
+    get_logger() call sets the logger up again.
+    """
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+
+    logger = logging.getLogger("user_data")
+    for handler in list(logger.handlers):
+        if not isinstance(handler, BoundedQueueHandler):
+            continue
+        logger.removeHandler(handler)
+        if handler.policy == "count" and handler.dropped:
+            record = logger.makeRecord(
+                logger.name, logging.WARNING, __file__, 0,
+                "%d records dropped, log queue full", (handler.dropped,),
+                None)
+            listener.handle(record)
+    for handler in listener.handlers:
+        handler.flush()
+
+
 def filter_datum(
         fields: List[str], redaction: str, message: str, separator: str,
+        mode: str = "regex",
 ) -> str:
     """
     Obfuscate specified fields in a log message.
@@ -52,55 +329,525 @@ def filter_datum(
     message: string representing the log line
     separator: string representing the character separating fields
     in the log line
+    mode: "regex" or "scan", the engine redacting the fields
 
     Returns:
             String: Log message with specified fields obfuscated.
     """
-    extract, replace = (rgx["extract"], rgx["replace"])
-    return re.sub(extract(fields, separator), replace(redaction), message)
+    return get_engine(fields, redaction, separator, mode).redact(message)
+
+
+def _chunks(items: Iterable, size: int) -> Iterator[list]:
+    """ Split an iterable into lists of at most size items """
+    iterator = iter(items)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def _map_chunks(func: Callable, chunks: Iterator[list],
+                workers: int) -> Iterator[list]:
+    """
+    Apply func to every chunk, keeping the input order.
+
+    With more than one worker the chunks are fanned out to a process
+    pool, with at most two chunks per worker in flight so memory does
+    not grow with the input.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield func(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _redact_chunk(fields: Tuple[str, ...], redaction: str, separator: str,
+                  mode: str, messages: List[str]) -> List[str]:
+    """ Redact a chunk of messages with one engine """
+    engine = get_engine(fields, redaction, separator, mode)
+    return [engine.redact(message) for message in messages]
+
+
+def filter_data(
+        fields: List[str], redaction: str, messages: Iterable[str],
+        separator: str, chunk_size: int = CHUNK_SIZE, workers: int = 0,
+        mode: str = "regex",
+) -> Iterator[str]:
+    """
+    Obfuscate specified fields in a stream of log messages.
+
+    Arguments:
+    fields: list of strings representing fields to obfuscate
+    redaction: string representing the replacement for obfuscated fields
+    messages: iterable of log lines, consumed lazily
+    separator: string representing the character separating fields
+    in the log lines
+    chunk_size: number of lines redacted at a time
+    workers: number of processes to redact with, 0 to stay in process
+    mode: "regex" or "scan", the engine redacting the fields
+
+    Returns:
+            Iterator: Log messages with specified fields obfuscated,
+            in input order.
+    """
+    redact = partial(_redact_chunk, tuple(fields), redaction, separator,
+                     mode)
+    for chunk in _map_chunks(redact, _chunks(messages, chunk_size),
+                             workers):
+        yield from chunk
+
+
+def _redact_rows(indexes: Tuple[int, ...], redaction: str,
+                 rows: List[List[str]]) -> List[List[str]]:
+    """ Redact the given columns of a chunk of CSV rows """
+    for row in rows:
+        for index in indexes:
+            if index < len(row):
+                row[index] = redaction
+    return rows
+
+
+def redact_csv(src: TextIO, dst: TextIO, fields: Iterable[str] = PII_FIELDS,
+               redaction: str = "***", workers: int = 0,
+               chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Stream a CSV file with a header row, redacting the columns named
+    after the given fields.
+
+    Columns are redacted by index, so values are never scanned. Rows are
+    read and written a chunk at a time, optionally on a process pool.
+
+    Args:
+        src (TextIO): The CSV to read, opened with newline=''.
+        dst (TextIO): Where to write the redacted CSV.
+        fields (iterable): Names of the columns to obfuscate.
+        redaction (str): Replacement for the obfuscated values.
+        workers (int): Number of processes, 0 to stay in process.
+        chunk_size (int): Number of rows handled at a time.
+
+    Returns:
+        int: The number of data rows written.
+    """
+    reader = csv.reader(src)
+    writer = csv.writer(dst)
+    header = next(reader, None)
+    if header is None:
+        return 0
+    writer.writerow(header)
+
+    fields = frozenset(fields)
+    indexes = tuple(i for i, name in enumerate(header) if name in fields)
+    redact = partial(_redact_rows, indexes, redaction)
+    count = 0
+    for rows in _map_chunks(redact, _chunks(reader, chunk_size), workers):
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def _redact_csv_command(args: argparse.Namespace) -> int:
+    """ Run redact-csv and report its throughput on stderr """
+    src, dst = sys.stdin, sys.stdout
+    if args.input != '-':
+        src = open(args.input, newline='')
+    if args.output != '-':
+        dst = open(args.output, 'w', newline='')
+    start = time.perf_counter()
+    try:
+        count = redact_csv(src, dst, workers=args.workers,
+                           chunk_size=args.chunk_size)
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if dst is not sys.stdout:
+            dst.close()
+    elapsed = time.perf_counter() - start
+    print("Redacted {} rows in {:.2f}s ({:.0f} rows/s)".format(
+        count, elapsed, count / elapsed if elapsed else 0), file=sys.stderr)
+    return 0
+
+
+def cli(argv: List[str] = None) -> int:
+    """
+    Command line entry point: python -m filtered_logger [command]
+
+    Without a command, the users table is logged by main().
+
+    Returns:
+        int: The exit status.
+    """
+    parser = argparse.ArgumentParser(prog="filtered_logger")
+    commands = parser.add_subparsers(dest="command")
+    redact = commands.add_parser(
+        "redact-csv", help="redact the PII_FIELDS columns of a CSV file")
+    redact.add_argument("input", nargs="?", default="user_data.csv",
+                        help="CSV file to read, - for stdin")
+    redact.add_argument("-o", "--output", default="-",
+                        help="file to write, - for stdout (default)")
+    redact.add_argument("-w", "--workers", type=int, default=0,
+                        help="number of worker processes")
+    redact.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help="rows handled at a time")
+    args = parser.parse_args(argv)
+
+    if args.command == "redact-csv":
+        return _redact_csv_command(args)
+    main()
+    return 0
+
+
+def _is_alive(connection: Any) -> bool:
+    """
+    Health check run on checkout: ping the server through
+    is_connected() when the driver has it, else run a trivial query.
+    """
+    is_connected = getattr(connection, "is_connected", None)
+    try:
+        if is_connected is not None:
+            return bool(is_connected())
+        cursor = connection.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class PooledConnection:
+    """
+    Proxy to a pooled connection: close() hands the connection back to
+    its pool instead of closing it.
+    """
+
+    def __init__(self, pool: "ConnectionPool", connection: Any):
+        self._pool = pool
+        self._connection = connection
+
+    def __getattr__(self, name: str) -> Any:
+        if self._connection is None:
+            raise AttributeError("connection returned to the pool")
+        return getattr(self._connection, name)
+
+    def close(self) -> None:
+        """ Return the connection to the pool """
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            self._pool.release(connection)
+
+    def __enter__(self) -> "PooledConnection":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of database connections.
+
+    Connections are opened lazily by the connect callable, at most size
+    of them at a time, and health checked every time they are checked
+    out. Any DB-API driver works, e.g. sqlite3 as a local stand-in.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = DB_POOL_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT,
+                 check: Callable[[Any], bool] = _is_alive):
+        """
+        Args:
+            connect (callable): Opens a new connection.
+            size (int): Maximum number of connections checked out.
+            timeout (float): Seconds to wait for a free connection.
+            check (callable): Tells whether an idle connection is usable.
+        """
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.check = check
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self) -> PooledConnection:
+        """
+        Check a connection out of the pool, reusing a healthy idle one
+        or opening a new one.
+
+        Raises:
+            TimeoutError: If no connection frees up within the timeout.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("no free connection in the pool")
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    connection = self.connect()
+                    break
+                if self.check(connection):
+                    break
+                self._discard(connection)
+        except BaseException:
+            self._slots.release()
+            raise
+        return PooledConnection(self, connection)
+
+    def release(self, connection: Any) -> None:
+        """ Roll back any open transaction and put a connection back """
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+        else:
+            self._idle.put(connection)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        """ Context manager checking a connection out and back in """
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def close(self) -> None:
+        """ Close all the idle connections """
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _discard(connection: Any) -> None:
+        """ Close a connection, ignoring a dead link """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def _db_settings() -> Dict[str, str]:
+    """ Database credentials from the environment variables """
+    return {
+        "user": os.getenv("PERSONAL_DATA_DB_USERNAME", "root"),
+        "password": os.getenv("PERSONAL_DATA_DB_PASSWORD", ""),
+        "host": os.getenv("PERSONAL_DATA_DB_HOST", "localhost"),
+        "database": os.getenv("PERSONAL_DATA_DB_NAME"),
+    }
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the process-wide pool for the PERSONAL_DATA_DB_* settings,
+    creating it on first use. Its size and checkout timeout come from
+    PERSONAL_DATA_DB_POOL_SIZE and PERSONAL_DATA_DB_POOL_TIMEOUT.
+
+    Returns:
+        ConnectionPool: The pool of MySQL connections.
+    """
+    settings = _db_settings()
+    key = tuple(sorted(settings.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                partial(mysql.connector.connect, **settings),
+                size=int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE",
+                                   DB_POOL_SIZE)),
+                timeout=float(os.getenv("PERSONAL_DATA_DB_POOL_TIMEOUT",
+                                        DB_POOL_TIMEOUT)))
+            _pools[key] = pool
+    return pool
 
 
 def get_db():
     """
     Returns a connector to the database.
 
+    The connection comes from the process-wide pool; closing it puts it
+    back in the pool.
+
     Returns:
-    mysql.connector.connection.MySQLConnection: Connector to the database.
+    PooledConnection: Connector to the database, None on error.
     """
-    # Get database credentials from environment variables
-    username = os.getenv("PERSONAL_DATA_DB_USERNAME", "root")
-    password = os.getenv("PERSONAL_DATA_DB_PASSWORD", "")
-    host = os.getenv("PERSONAL_DATA_DB_HOST", "localhost")
-    db_name = os.getenv("PERSONAL_DATA_DB_NAME")
-
-    # Connect to the database
     try:
-        connection = mysql.connector.connect(
-            user=username,
-            password=password,
-            host=host,
-            database=db_name
-        )
-        print("Connected to the database successfully!")
-        return connection
+        return get_pool().acquire()
     except mysql.connector.Error as err:
         print("Error:", err)
 
 
+@contextmanager
+def db_connection() -> Iterator[PooledConnection]:
+    """
+    Context manager over a pooled database connection:
+
+        with db_connection() as db:
+            cursor = db.cursor()
+    """
+    with get_pool().connection() as connection:
+        yield connection
+
+
+def iter_users(db, batch_size: int = USERS_BATCH_SIZE
+               ) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the rows of the users table.
+
+    Rows are read batch_size at a time from an unbuffered cursor, so the
+    table is never held in memory at once.
+
+    Args:
+        db: A database connection, as returned by get_db().
+        batch_size (int): Number of rows fetched per round trip.
+
+    Returns:
+        Iterator: One dict per row, keyed by column name.
+    """
+    try:
+        cursor = db.cursor(buffered=False)
+    except TypeError:
+        cursor = db.cursor()
+    try:
+        cursor.execute("SELECT * FROM users;")
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            for row in rows:
+                yield dict(zip(columns, row))
+            rows = cursor.fetchmany(batch_size)
+    finally:
+        cursor.close()
+
+
 class RedactingFormatter(logging.Formatter):
-    """ Redacting Formatter class """
+    """ Redacting Formatter class
+
+    Records whose message is a mapping, or which carry one in
+    extra={"data": {...}}, are structured: the fields are redacted by
+    key in the mapping, and only the free text (the message of an
+    extra={"data": ...} record and the traceback) goes through the
+    engine rather than the whole rendered line.
+    """
     REDACTION = "***"
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     FORMAT_FIELDS = ('name', 'levelname', 'asctime', 'message')
     SEPARATOR = ";"
+    DATA_ATTR = "data"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], mode: str = "regex",
+                 json_lines: bool = False):
         super(RedactingFormatter, self).__init__(self.FORMAT)
         self.fields = fields
+        self.field_set = frozenset(fields)
+        self.json_lines = json_lines
+        self.engine = get_engine(fields, self.REDACTION, self.SEPARATOR,
+                                 mode)
 
     def format(self, record: logging.LogRecord) -> str:
         """formats a LogRecords
         """
+        data = self.structured_data(record)
+        if data is not None:
+            return self.format_structured(record, data)
         msg = super(RedactingFormatter, self).format(record)
-        txt = filter_datum(self.fields, self.REDACTION, msg, self.SEPARATOR)
-        return txt
+        return self.engine.redact(msg)
+
+    def structured_data(self, record: logging.LogRecord) -> Optional[dict]:
+        """ Returns the mapping of a structured record, else None """
+        if isinstance(record.msg, Mapping):
+            return record.msg
+        data = getattr(record, self.DATA_ATTR, None)
+        if isinstance(data, Mapping):
+            return data
+        return None
+
+    def redact_data(self, data: Mapping) -> dict:
+        """ Returns a copy of a mapping with the fields redacted by key """
+        fields = self.field_set
+        return {key: self.REDACTION if key in fields else value
+                for key, value in data.items()}
+
+    @staticmethod
+    def exception_text(record: logging.LogRecord) -> Optional[str]:
+        """ Returns the rendered traceback of a record, if any """
+        if record.exc_text is None and record.exc_info:
+            return logging.Formatter().formatException(record.exc_info)
+        return record.exc_text
+
+    def format_structured(self, record: logging.LogRecord,
+                          data: Mapping) -> str:
+        """
+        Formats a structured record, as a FORMAT line of key=value;
+        pairs or as one JSON object per line.
+        """
+        data = self.redact_data(data)
+        text = None if isinstance(record.msg, Mapping) else \
+            self.engine.redact(record.getMessage())
+        exc_text = self.exception_text(record)
+        if exc_text:
+            exc_text = self.engine.redact(exc_text)
+        asctime = self.formatTime(record, self.datefmt)
+
+        if self.json_lines:
+            line = {'name': record.name, 'levelname': record.levelname,
+                    'asctime': asctime}
+            if text is None:
+                line['message'] = data
+            else:
+                line['message'] = text
+                line[self.DATA_ATTR] = data
+            if exc_text:
+                line['exc_text'] = exc_text
+            return json.dumps(line, default=str)
+
+        pairs = ''.join('{}={}{}'.format(key, value, self.SEPARATOR)
+                        for key, value in data.items())
+        values = {'name': record.name, 'levelname': record.levelname,
+                  'asctime': asctime,
+                  'message': pairs if text is None else
+                  '{} {}'.format(text, pairs)}
+        line = self.FORMAT % values
+        if exc_text:
+            line = '{}\n{}'.format(line, exc_text)
+        return line
+
+
+def main() -> None:
+    """
+    Log every row of the users table, filtered, through the user_data
+    logger, and report the throughput on stderr.
+    """
+    db = get_db()
+    if db is None:
+        return
+    logger = get_logger()
+    count = 0
+    start = time.perf_counter()
+    try:
+        for row in iter_users(db):
+            logger.info("; ".join(
+                "{}={}".format(key, value) for key, value in row.items())
+                + ";")
+            count += 1
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start
+    print("Logged {} rows in {:.2f}s ({:.0f} rows/s)".format(
+        count, elapsed, count / elapsed if elapsed else 0), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(cli())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Tests for filtered_logger
+"""
+
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import filtered_logger
+from filtered_logger import (PII_FIELDS, ConnectionPool, PooledConnection,
+                             RedactingFormatter, RedactionEngine,
+                             ScanRedactionEngine, db_connection,
+                             filter_datum, get_db, get_engine, iter_users)
+
+
+SCAN_CASES = [
+    ("name=Bob;email=bob@x.io;", ["name", "email"]),
+    ("name=Bob;email=bob@x.io", ["email"]),
+    ("email=;name=;", ["name", "email"]),
+    ("username=bob;name=Bob;", ["name"]),
+    ("username=bob;name=Bob;", ["name", "username"]),
+    ("xname=a=b;name==;", ["name"]),
+    ("a=name=b;c=d", ["name"]),
+    ("=name;name", ["name"]),
+    ("ssn=1;ssn=2;;ssn", ["ssn"]),
+    ("", ["name"]),
+    (";;;", ["name"]),
+    ("no fields here", list(PII_FIELDS)),
+    ("password=p=a=s;s", ["password", "pass"]),
+]
+
+
+def _regex(fields, redaction, message, separator):
+    """ Output of the reference regex engine """
+    return RedactionEngine(tuple(fields), redaction,
+                           separator).redact(message)
+
+
+@pytest.mark.parametrize("message,fields", SCAN_CASES)
+@pytest.mark.parametrize("separator", [";", ",", "|", " "])
+def test_scan_matches_regex(message, fields, separator):
+    message = message.replace(";", separator)
+    assert filter_datum(fields, "xxx", message, separator, mode="scan") == \
+        _regex(fields, "xxx", message, separator)
+
+
+def test_scan_matches_regex_fuzz():
+    rnd = random.Random(2024)
+    pieces = ["name", "email", "ssn", "password", "phone", "user", "=",
+              ";", "a", "b", "1", " ", "@", "."]
+    for _ in range(20000):
+        fields = rnd.sample(PII_FIELDS + ("user", "username", "pass"),
+                            rnd.randint(1, 4))
+        message = "".join(rnd.choice(pieces)
+                          for _ in range(rnd.randint(0, 30)))
+        redaction = rnd.choice(["***", "", "x;y", "=", "&"])
+        expected = _regex(fields, redaction, message, ";")
+        assert filter_datum(fields, redaction, message, ";",
+                            mode="scan") == expected, (fields, message)
+
+
+@pytest.mark.parametrize("fields,redaction,separator", [
+    (["na.me"], "***", ";"),
+    (["name"], r"\g<field>", ";"),
+    (["name"], "***", ";;"),
+    (["name"], "***", "."),
+    (["name"], "***", "="),
+    (["a;b"], "***", ";"),
+])
+def test_scan_falls_back_to_regex(fields, redaction, separator):
+    engine = get_engine(fields, redaction, separator, mode="scan")
+    assert type(engine) is RedactionEngine
+    message = "name=1{0}na.me=2{0}nazme=3{0}a;b=4".format(separator)
+    assert engine.redact(message) == \
+        _regex(fields, redaction, message, separator)
+
+
+def test_scan_engine_used_when_supported():
+    engine = get_engine(list(PII_FIELDS), "***", ";", mode="scan")
+    assert type(engine) is ScanRedactionEngine
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        filter_datum(["name"], "***", "name=a;", ";", mode="other")
+
+
+def test_formatter_scan_matches_regex():
+    records = [
+        logging.LogRecord("user_data", logging.INFO, None, None, message,
+                          None, None)
+        for message in (
+            "name=Bob;email=bob@x.io;ssn=1;password=p;ip=1.2.3.4;",
+            "username=a;phone=5;last_login=2019-11-14T06:16:24;",
+            "nothing to redact",
+        )
+    ]
+    regex = RedactingFormatter(list(PII_FIELDS))
+    scan = RedactingFormatter(list(PII_FIELDS), mode="scan")
+    for record in records:
+        assert scan.format(record) == regex.format(record)
+
+
+@pytest.fixture
+def sqlite_pool(tmp_path):
+    """ Pool of sqlite3 connections to a users table, as a local
+    stand-in for MySQL """
+    db_path = str(tmp_path / "users.db")
+    with sqlite3.connect(db_path) as db:
+        db.execute("CREATE TABLE users (name TEXT, email TEXT)")
+        db.executemany("INSERT INTO users VALUES (?, ?)",
+                       [("u{}".format(i), "u{}@x.io".format(i))
+                        for i in range(2500)])
+    opened = []
+
+    def connect():
+        connection = sqlite3.connect(db_path, check_same_thread=False)
+        opened.append(connection)
+        return connection
+
+    pool = ConnectionPool(connect, size=3, timeout=0.2)
+    pool.opened = opened
+    yield pool
+    pool.close()
+
+
+def test_pool_reuses_connections(sqlite_pool):
+    with sqlite_pool.connection() as db:
+        first = db._connection
+    with sqlite_pool.connection() as db:
+        assert db._connection is first
+    assert len(sqlite_pool.opened) == 1
+
+
+def test_pool_bounds_checkouts(sqlite_pool):
+    held = [sqlite_pool.acquire() for _ in range(3)]
+    with pytest.raises(TimeoutError):
+        sqlite_pool.acquire()
+    held[0].close()
+    sqlite_pool.acquire().close()
+    for db in held[1:]:
+        db.close()
+    assert len(sqlite_pool.opened) == 3
+
+
+def test_pool_wakes_waiter(sqlite_pool):
+    sqlite_pool.timeout = 5
+    held = [sqlite_pool.acquire() for _ in range(3)]
+    got = []
+    waiter = threading.Thread(
+        target=lambda: got.append(sqlite_pool.acquire()))
+    waiter.start()
+    time.sleep(0.05)
+    assert not got
+    held[1].close()
+    waiter.join(1)
+    assert len(got) == 1
+    for db in held[:1] + held[2:] + got:
+        db.close()
+
+
+def test_pool_discards_dead_connections(sqlite_pool):
+    with sqlite_pool.connection() as db:
+        dead = db._connection
+    dead.close()
+    with sqlite_pool.connection() as db:
+        assert db._connection is not dead
+        assert db.execute("SELECT COUNT(*) FROM users").fetchone() == (2500,)
+    assert len(sqlite_pool.opened) == 2
+
+
+def test_pool_rolls_back_on_release(sqlite_pool):
+    with sqlite_pool.connection() as db:
+        db.execute("INSERT INTO users VALUES ('tmp', 'tmp')")
+    with sqlite_pool.connection() as db:
+        assert db.execute("SELECT COUNT(*) FROM users WHERE name = 'tmp'"
+                          ).fetchone() == (0,)
+
+
+def test_pooled_connection_close(sqlite_pool):
+    db = sqlite_pool.acquire()
+    db.close()
+    db.close()
+    with pytest.raises(AttributeError):
+        db.cursor()
+    held = [sqlite_pool.acquire() for _ in range(3)]
+    with pytest.raises(TimeoutError):
+        sqlite_pool.acquire()
+    for db in held:
+        db.close()
+
+
+def test_pool_concurrency(sqlite_pool):
+    sqlite_pool.timeout = 10
+    lock = threading.Lock()
+    active = [0, 0]
+    errors = []
+
+    def work():
+        try:
+            for _ in range(200):
+                with sqlite_pool.connection() as db:
+                    with lock:
+                        active[0] += 1
+                        active[1] = max(active)
+                    db.execute("SELECT 1").fetchall()
+                    with lock:
+                        active[0] -= 1
+        except Exception as err:
+            errors.append(err)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert active[1] <= 3
+    assert len(sqlite_pool.opened) <= 3
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 1000, 5000])
+def test_iter_users_streams_all_rows(sqlite_pool, batch_size):
+    with sqlite_pool.connection() as db:
+        rows = list(iter_users(db, batch_size))
+    assert len(rows) == 2500
+    assert rows[0] == {"name": "u0", "email": "u0@x.io"}
+    assert rows[-1] == {"name": "u2499", "email": "u2499@x.io"}
+
+
+def test_get_db_uses_pool(sqlite_pool, monkeypatch):
+    monkeypatch.setattr(filtered_logger, "get_pool", lambda: sqlite_pool)
+    db = get_db()
+    assert isinstance(db, PooledConnection)
+    connection = db._connection
+    db.close()
+    with db_connection() as db:
+        assert db._connection is connection
+
+
+def _record(msg, exc=None, **extra):
+    """ LogRecord as the user_data logger makes it """
+    exc_info = (type(exc), exc, None) if exc is not None else None
+    record = logging.LogRecord("user_data", logging.INFO, None, None, msg,
+                               None, exc_info)
+    record.__dict__.update(extra)
+    return record
+
+
+@pytest.mark.parametrize("json_lines", [False, True])
+@pytest.mark.parametrize("mode", ["regex", "scan"])
+def test_structured_redacts_text_message(mode, json_lines):
+    formatter = RedactingFormatter(list(PII_FIELDS), mode=mode,
+                                   json_lines=json_lines)
+    line = formatter.format(_record("user name=bob;email=bob@x;",
+                                    data={"phone": "555-01", "id": 7}))
+    assert "bob" not in line and "555-01" not in line
+    assert "name=***;email=***;" in line
+    assert "7" in line
+
+
+@pytest.mark.parametrize("json_lines", [False, True])
+@pytest.mark.parametrize("mode", ["regex", "scan"])
+def test_structured_redacts_traceback(mode, json_lines):
+    formatter = RedactingFormatter(list(PII_FIELDS), mode=mode,
+                                   json_lines=json_lines)
+    exc = ValueError("bad row ssn=123-45;")
+    line = formatter.format(_record({"ip": "p"}, exc))
+    assert "123-45" not in line
+    assert "ssn=***;" in line
+    assert formatter.format(_record("failed", exc)).endswith(
+        "ValueError: bad row ssn=***;")
@@ -4,7 +4,7 @@ Route module for the API
 """
 from os import getenv
 from api.v1.views import app_views
-from api.v1.auth.auth import Auth
+from api.v1.auth.auth import Auth, PathMatcher
 from flask import Flask, jsonify, abort, request
 from flask_cors import (CORS, cross_origin)
 import os
@@ -23,6 +23,13 @@ else:
     auth = Auth()
 
 
+EXCLUDED_PATHS = PathMatcher([
+        '/api/v1/status/',
+        '/api/v1/unauthorized/',
+        '/api/v1/forbidden/'
+])
+
+
 @app.before_request
 def before_request_handler():
     """ Handles requests first
@@ -30,15 +37,7 @@ def before_request_handler():
     if auth is None:
         return
 
-    excluded_paths = [
-            '/api/v1/status/',
-            '/api/v1/unauthorized/',
-            '/api/v1/forbidden/'
-    ]
-    if request.path in excluded_paths:
-        return
-
-    if not auth.require_auth(request.path, excluded_paths):
+    if not auth.require_auth(request.path, EXCLUDED_PATHS):
         return
 
     auth_header = auth.authorization_header(request)
@@ -4,9 +4,118 @@ BasicAuth class for managing basic authentication.
 """
 
 from api.v1.auth.auth import Auth
+from collections import OrderedDict
 from models.user import User
 from typing import TypeVar
 import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+
+class CredentialCache:
+    """
+    Bounded LRU cache of verified Authorization headers.
+
+    Each header is kept only as an HMAC digest under a per-process key
+    and maps to the ID of its user for ttl seconds. An entry is dropped
+    as soon as its user is removed or has a new password.
+    """
+
+    def __init__(self, ttl: float = None, max_size: int = None):
+        """
+        Initialize an empty cache.
+
+        Args:
+            ttl (float): Lifetime of an entry in seconds, from the
+            BASIC_AUTH_CACHE_TTL environment variable by default (60).
+            0 disables the cache.
+            max_size (int): Maximum number of entries, from the
+            BASIC_AUTH_CACHE_SIZE environment variable by default (1024).
+        """
+        if ttl is None:
+            ttl = float(os.getenv('BASIC_AUTH_CACHE_TTL', 60))
+        if max_size is None:
+            max_size = int(os.getenv('BASIC_AUTH_CACHE_SIZE', 1024))
+        self.ttl = ttl
+        self.max_size = max_size
+        self.key = os.urandom(32)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, authorization_header: str) -> bytes:
+        """
+        Keyed digest of an Authorization header.
+
+        Args:
+            authorization_header (str): The Authorization header string.
+
+        Returns:
+            bytes: The HMAC-SHA256 of the header under the cache key.
+        """
+        return hmac.new(self.key,
+                        authorization_header.encode('utf-8',
+                                                    'surrogatepass'),
+                        hashlib.sha256).digest()
+
+    def get(self, authorization_header: str) -> TypeVar('User'):
+        """
+        Get the user a header was verified for.
+
+        Args:
+            authorization_header (str): The Authorization header string.
+
+        Returns:
+            User: The User instance, or None if the header isn't cached,
+            has expired, or its user was removed or changed password.
+        """
+        if self.ttl <= 0 or self.max_size <= 0:
+            return None
+        digest = self.digest(authorization_header)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None and entry[2] <= now:
+                del self.entries[digest]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(digest)
+
+        user = User.get(entry[0])
+        with self.lock:
+            if user is None or user.password != entry[1]:
+                self.entries.pop(digest, None)
+                self.misses += 1
+                return None
+            self.hits += 1
+        return user
+
+    def put(self, authorization_header: str, user: TypeVar('User')):
+        """
+        Remember that a header was verified for a user.
+
+        Args:
+            authorization_header (str): The Authorization header string.
+            user (User): The User instance the header belongs to.
+        """
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        digest = self.digest(authorization_header)
+        now = time.monotonic()
+        with self.lock:
+            self.entries[digest] = (user.id, user.password, now + self.ttl)
+            self.entries.move_to_end(digest)
+            while self.entries:
+                oldest = next(iter(self.entries.values()))
+                if len(self.entries) <= self.max_size and oldest[2] > now:
+                    break
+                self.entries.popitem(last=False)
 
 
 class BasicAuth(Auth):
@@ -15,6 +124,13 @@ class BasicAuth(Auth):
     basic authentication in an API.
     """
 
+    def __init__(self):
+        """
+        Initialize the BasicAuth instance with an empty credential cache.
+        """
+        super().__init__()
+        self.credential_cache = CredentialCache()
+
     def extract_base64_authorization_header(
             self, authorization_header: str) -> str:
         """
@@ -132,6 +248,10 @@ class BasicAuth(Auth):
         if authorization_header is None:
             return None
 
+        user = self.credential_cache.get(authorization_header)
+        if user is not None:
+            return user
+
         base64_auth_header = self.extract_base64_authorization_header(
                 authorization_header)
         if base64_auth_header is None:
@@ -148,5 +268,8 @@ class BasicAuth(Auth):
         if user_email is None or user_pwd is None:
             return None
 
-        return self.user_object_from_credentials(
+        user = self.user_object_from_credentials(
                 user_email, user_pwd)
+        if user is not None:
+            self.credential_cache.put(authorization_header, user)
+        return user
@@ -1,40 +1,1623 @@
 #!/usr/bin/env python3
 """ Base module
 """
+from bisect import bisect_left, bisect_right, insort
 from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
+from functools import lru_cache
+from itertools import islice
+from operator import attrgetter, itemgetter
+from typing import TypeVar, List, Iterable, Iterator
+from os import getenv, path
+import atexit
 import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
 import uuid
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
 DATA = {}
+INDEXES = {}
+SORTED_INDEXES = {}
+ORDERS = {}
+LOCKS = {}
+JOURNAL_COMPACT_EVERY = int(getenv('BASE_JOURNAL_COMPACT', 10000))
+WRITE_BEHIND_MS = int(getenv('BASE_WRITE_BEHIND_MS', 100))
+WRITE_BEHIND_OPS = int(getenv('BASE_WRITE_BEHIND_OPS', 1000))
+LAZY_LOAD = getenv('BASE_LAZY_LOAD', '0').lower() in ('1', 'true', 'yes')
+TIMESTAMP_CACHE_SIZE = int(getenv('BASE_TIMESTAMP_CACHE', 1 << 17))
+SCAN_BULK_MIN = 64
+SQLITE_PATH = getenv('BASE_SQLITE_PATH', '.db.sqlite3')
+SQLITE_TIMEOUT_MS = int(getenv('BASE_SQLITE_TIMEOUT_MS', 5000))
+logger = logging.getLogger(__name__)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    """ Parse a TIMESTAMP_FORMAT string, with the fixed-format ISO parser
+    when it has the exact shape and strptime otherwise
+    """
+    if len(value) == 19 and value[10] == 'T':
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, TIMESTAMP_FORMAT)
+
+
+@lru_cache(maxsize=TIMESTAMP_CACHE_SIZE)
+def _format_timestamp(value: datetime) -> str:
+    """ Format a datetime as TIMESTAMP_FORMAT, with the ISO formatter
+    """
+    return value.isoformat(timespec='seconds')
+
+
+def dumps_json(data) -> bytes:
+    """ Encode JSON data compactly, with orjson when it is installed
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def _write_json(file_path: str, objs_json: dict):
+    """ Replace a JSON file atomically, through a temporary file
+    """
+    tmp_path = "{}.tmp".format(file_path)
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump(objs_json, f)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class RWLock():
+    """ Readers-writer lock: any number of readers or a single writer.
+    Both sides are reentrant and the writer may also read; a waiting
+    writer holds off new readers so that it can't starve.
+    """
+
+    def __init__(self):
+        """ Initialize an unlocked lock
+        """
+        self.mutex = threading.Lock()
+        self.condition = threading.Condition(self.mutex)
+        self.readers = {}
+        self.writer = None
+        self.depth = 0
+        self.waiting = 0
+        self.read = _ReadSide(self)
+        self.write = _WriteSide(self)
+
+    def acquire_read(self):
+        """ Wait until no writer holds or waits for the lock
+        """
+        me = threading.get_ident()
+        with self.mutex:
+            if self.writer != me and me not in self.readers and \
+                    (self.writer is not None or self.waiting):
+                self.condition.wait_for(
+                    lambda: self.writer is None and not self.waiting)
+            self.readers[me] = self.readers.get(me, 0) + 1
+
+    def release_read(self):
+        """ Release one level of read
+        """
+        me = threading.get_ident()
+        with self.mutex:
+            depth = self.readers.pop(me) - 1
+            if depth:
+                self.readers[me] = depth
+            elif not self.readers and self.waiting:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        """ Wait until nobody else holds the lock
+        """
+        me = threading.get_ident()
+        with self.mutex:
+            if self.writer != me:
+                if self.writer is not None or self.readers:
+                    self.waiting += 1
+                    try:
+                        self.condition.wait_for(
+                            lambda: self.writer is None and
+                            not self.readers)
+                    finally:
+                        self.waiting -= 1
+                self.writer = me
+            self.depth += 1
+
+    def release_write(self):
+        """ Release one level of write
+        """
+        with self.mutex:
+            self.depth -= 1
+            if not self.depth:
+                self.writer = None
+                self.condition.notify_all()
+
+
+class _ReadSide():
+    """ Read side of a RWLock, as a context manager
+    """
+    __slots__ = ('lock',)
+
+    def __init__(self, lock: RWLock):
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire_read()
+
+    def __exit__(self, *exc_info):
+        self.lock.release_read()
+
+
+class _WriteSide(_ReadSide):
+    """ Write side of a RWLock, as a context manager
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        self.lock.acquire_write()
+
+    def __exit__(self, *exc_info):
+        self.lock.release_write()
+
+
+def _lock(s_class: str) -> RWLock:
+    """ Readers-writer lock guarding the objects of a class in DATA,
+    their indexes and their order
+    """
+    lock = LOCKS.get(s_class)
+    if lock is None:
+        lock = LOCKS.setdefault(s_class, RWLock())
+    return lock
+
+
+OPERATORS = {
+    'eq': lambda value, probe: value == probe,
+    'gt': lambda value, probe: value is not None and value > probe,
+    'lt': lambda value, probe: value is not None and value < probe,
+    'in': lambda value, probe: value in probe,
+    'startswith': lambda value, probe:
+        type(value) is str and value.startswith(probe),
+    'endswith': lambda value, probe:
+        type(value) is str and value.endswith(probe),
+}
+
+
+def _predicates(attributes: dict) -> list:
+    """ (attribute, operator, value) of each search attribute: a key
+    attribute__operator applies one of OPERATORS, a plain key tests
+    equality
+    """
+    predicates = []
+    for key, value in attributes.items():
+        attr, _, op = key.rpartition('__')
+        if not attr or op not in OPERATORS:
+            attr, op = key, 'eq'
+        elif op == 'in':
+            value = list(value)
+        predicates.append((attr, op, value))
+    return predicates
+
+
+def _prefix_end(prefix: str):
+    """ Smallest string greater than every string starting with prefix,
+    None when there is none
+    """
+    if not prefix or ord(prefix[-1]) == sys.maxunicode:
+        return None
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _matches(obj, predicates: list) -> bool:
+    """ Whether an object satisfies all the predicates
+    """
+    for attr, op, probe in predicates:
+        value = getattr(obj, attr)
+        try:
+            if op == 'eq':
+                if value != probe:
+                    return False
+            elif not OPERATORS[op](value, probe):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def _filter(objs: list, predicate: tuple) -> list:
+    """ Objects of a list satisfying a predicate, tested on the whole
+    list at once
+    """
+    attr, op, probe = predicate
+    pairs = zip(objs, map(attrgetter(attr), objs))
+    try:
+        if op == 'eq':
+            return [obj for obj, value in pairs if value == probe]
+        if op == 'gt':
+            return [obj for obj, value in pairs
+                    if value is not None and value > probe]
+        if op == 'lt':
+            return [obj for obj, value in pairs
+                    if value is not None and value < probe]
+        if op == 'in':
+            try:
+                probe = set(probe)
+            except TypeError:
+                pass
+            return [obj for obj, value in pairs if value in probe]
+        if type(probe) is str:
+            method = getattr(str, op)
+            return [obj for obj, value in pairs
+                    if type(value) is str and method(value, probe)]
+        return [obj for obj, value in pairs if OPERATORS[op](value, probe)]
+    except TypeError:
+        return [obj for obj in objs if _matches(obj, [predicate])]
+
+
+def _matches_json(obj_json: dict, predicates: list) -> bool:
+    """ Whether an object, still as its JSON dictionary, may satisfy all
+    the predicates. Only the predicates on keys of the dictionary are
+    tested; the others, e.g. on a property, are left to _matches once
+    the object is built.
+    """
+    for attr, op, probe in predicates:
+        if attr not in obj_json:
+            continue
+        value = obj_json[attr]
+        if type(value) is str:
+            sample = probe[0] if op == 'in' and probe else probe
+            if type(sample) is datetime:
+                value = _parse_timestamp(value)
+        try:
+            if not OPERATORS[op](value, probe):
+                return False
+        except TypeError:
+            return False
+    return True
+
+
+def _json_value(cls, obj_json: dict, attr: str):
+    """ Value of an attribute in the JSON dictionary of an object, its
+    timestamps parsed back to datetime
+    """
+    value = obj_json.get(attr)
+    if type(value) is str and attr in cls.__timestamps__:
+        return _parse_timestamp(value)
+    return value
+
+
+def _sorted_by(objs: Iterable, attr: str, reverse: bool = False) -> list:
+    """ Objects ordered by an attribute, the ones without a value last
+    """
+    valued = []
+    missing = []
+    for obj in objs:
+        if getattr(obj, attr, None) is None:
+            missing.append(obj)
+        else:
+            valued.append(obj)
+    valued.sort(key=attrgetter(attr), reverse=reverse)
+    return valued + missing
+
+
+class LazyObjects(dict):
+    """ Objects of a class by ID, as loaded in lazy mode: the JSON
+    dictionaries are kept in raw and an object is only built the first
+    time it is looked up
+    """
+
+    def __init__(self, cls, objs_json: dict):
+        """ Initialize from the JSON dictionaries by ID
+        """
+        super().__init__()
+        self.cls = cls
+        self.raw = objs_json
+        self.lock = threading.Lock()
+
+    def __missing__(self, obj_id: str):
+        """ Build an object from its JSON dictionary, once even when
+        concurrent readers hit it together
+        """
+        with self.lock:
+            if dict.__contains__(self, obj_id):
+                return dict.__getitem__(self, obj_id)
+            obj_json = self.raw.pop(obj_id)
+            try:
+                obj = self.cls(**obj_json)
+            except BaseException:
+                self.raw[obj_id] = obj_json
+                raise
+            dict.__setitem__(self, obj_id, obj)
+            return obj
+
+    def get(self, obj_id: str, default=None):
+        """ Return an object by ID, building it if needed
+        """
+        try:
+            return self[obj_id]
+        except KeyError:
+            return default
+
+    def __contains__(self, obj_id) -> bool:
+        return dict.__contains__(self, obj_id) or obj_id in self.raw
+
+    def __len__(self) -> int:
+        return dict.__len__(self) + len(self.raw)
+
+    def __setitem__(self, obj_id: str, obj):
+        self.raw.pop(obj_id, None)
+        dict.__setitem__(self, obj_id, obj)
+
+    def __delitem__(self, obj_id: str):
+        if self.raw.pop(obj_id, None) is None:
+            dict.__delitem__(self, obj_id)
+
+    def pop(self, obj_id: str, *default):
+        """ Remove an object by ID and return it
+        """
+        obj = self.get(obj_id)
+        if obj is None:
+            return dict.pop(self, obj_id, *default)
+        return dict.pop(self, obj_id)
+
+    def materialize(self):
+        """ Build all the objects not built yet
+        """
+        for obj_id in list(self.raw):
+            self.get(obj_id)
+
+    def __iter__(self):
+        self.materialize()
+        return dict.__iter__(self)
+
+    def keys(self):
+        self.materialize()
+        return dict.keys(self)
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    def ids(self) -> List[str]:
+        """ IDs of all the objects, built or not
+        """
+        with self.lock:
+            return list(self.raw) + list(dict.keys(self))
+
+    def snapshot(self) -> dict:
+        """ Copy of the objects by ID, the ones not built yet being left
+        as their JSON dictionary
+        """
+        with self.lock:
+            objs = dict(self.raw)
+            objs.update(dict(dict.items(self)))
+        return objs
+
+    def values_of(self, attr: str) -> list:
+        """ (value, ID) of an attribute for all the objects, built or not
+        """
+        with self.lock:
+            pairs = [(_json_value(self.cls, obj_json, attr), obj_id)
+                     for obj_id, obj_json in self.raw.items()]
+            pairs.extend((getattr(obj, attr, None), obj_id)
+                         for obj_id, obj in dict.items(self))
+        return pairs
+
+    def matching(self, predicates: list,
+                 ids: Iterable[str] = None) -> Iterator:
+        """ Objects satisfying the predicates, among ids or all of them.
+        Objects not built yet are matched on their JSON dictionary and
+        only built when they match.
+        """
+        if ids is None:
+            ids = self.ids()
+        for obj_id in ids:
+            obj_json = self.raw.get(obj_id)
+            if obj_json is not None and \
+                    not _matches_json(obj_json, predicates):
+                continue
+            obj = self.get(obj_id)
+            if obj is not None and _matches(obj, predicates):
+                yield obj
+
+
+def _snapshot(objs: dict) -> dict:
+    """ Copy of the objects of a class by ID
+    """
+    if isinstance(objs, LazyObjects):
+        return objs.snapshot()
+    return dict(objs)
+
+
+def _serialize(objs: dict) -> dict:
+    """ JSON dictionaries of a snapshot of objects by ID
+    """
+    objs_json = {}
+    ids = []
+    built = []
+    for obj_id, obj in objs.items():
+        if isinstance(obj, dict):
+            objs_json[obj_id] = obj
+        else:
+            objs_json[obj_id] = None
+            ids.append(obj_id)
+            built.append(obj)
+    objs_json.update(zip(ids, Base.to_json_many(built, True)))
+    return objs_json
+
+
+class FileStorage():
+    """ Storage keeping the objects in DATA, indexed in memory, and
+    rewriting the whole .db_<Class>.json file on each change.
+
+    Base forwards its class-level API (reload, save, remove, get, search,
+    count, page) to the storage; the subclasses only change how the
+    objects are persisted (load, dump, put, delete, flush, close).
+    """
+
+    def __init__(self):
+        """ Initialize the lock serializing the file writes
+        """
+        self.dump_lock = threading.Lock()
+
+    def file_path(self, s_class: str) -> str:
+        """ Path of the JSON file of a class
+        """
+        return ".db_{}.json".format(s_class)
+
+    def load(self, cls) -> dict:
+        """ Return the JSON dictionaries of all stored objects by ID
+        """
+        file_path = self.file_path(cls.__name__)
+        if not path.exists(file_path):
+            return {}
+        with open(file_path, 'r') as f:
+            return json.load(f)
+
+    def dump(self, cls):
+        """ Write all objects of a class to its file
+        """
+        s_class = cls.__name__
+        with _lock(s_class).read, self.dump_lock:
+            objs_json = _serialize(_snapshot(DATA[s_class]))
+            _write_json(self.file_path(s_class), objs_json)
+
+    def put(self, obj):
+        """ Persist a new or updated object
+        """
+        self.dump(obj.__class__)
+
+    def delete(self, obj):
+        """ Persist the removal of an object
+        """
+        self.dump(obj.__class__)
+
+    def delete_many(self, cls, objs: list):
+        """ Persist the removal of several objects of a class at once
+        """
+        self.dump(cls)
+
+    def reload(self, cls):
+        """ Replace the objects of a class in DATA by the stored ones. In
+        lazy mode (BASE_LAZY_LOAD) the objects are only built when get()
+        or search() hits them.
+        """
+        s_class = cls.__name__
+        with _lock(s_class).write:
+            DATA[s_class] = {}
+            INDEXES.pop(s_class, None)
+            SORTED_INDEXES.pop(s_class, None)
+            ORDERS.pop(s_class, None)
+            objs_json = self.load(cls)
+            if LAZY_LOAD:
+                DATA[s_class] = LazyObjects(cls, objs_json)
+                indexes = cls._indexes()
+                for obj_id, obj_json in objs_json.items():
+                    for attr, index in indexes.items():
+                        _index_add(index, _json_value(cls, obj_json, attr),
+                                   obj_id)
+                return
+            for obj_id, obj_json in objs_json.items():
+                obj = cls(**obj_json)
+                DATA[s_class][obj_id] = obj
+                obj._index()
+
+    def save(self, obj):
+        """ Add or replace an object in DATA and persist it
+        """
+        s_class = obj.__class__.__name__
+        with _lock(s_class).write:
+            stored = DATA[s_class].get(obj.id)
+            if stored is not obj:
+                if stored is not None:
+                    stored._unindex()
+                DATA[s_class][obj.id] = obj
+                obj._index()
+                order = ORDERS.get(s_class)
+                if stored is None and order is not None:
+                    insort(order, obj.id)
+            self.put(obj)
+
+    @staticmethod
+    def _discard(s_class: str, obj) -> bool:
+        """ Take an object out of DATA, its indexes and its order, and
+        tell whether it was stored. The caller holds the write lock of
+        the class.
+        """
+        stored = DATA[s_class].get(obj.id)
+        if stored is None:
+            return False
+        del DATA[s_class][obj.id]
+        stored._unindex()
+        order = ORDERS.get(s_class)
+        if order is not None:
+            i = bisect_left(order, obj.id)
+            if i < len(order) and order[i] == obj.id:
+                del order[i]
+        return True
+
+    def remove(self, obj):
+        """ Remove an object from DATA and persist the removal
+        """
+        s_class = obj.__class__.__name__
+        with _lock(s_class).write:
+            if self._discard(s_class, obj):
+                self.delete(obj)
+
+    def remove_many(self, cls, objs: Iterable) -> int:
+        """ Remove objects of a class from DATA and persist all the
+        removals at once. Return the number of objects removed. For a
+        large batch the sorted indexes and the ID order are filtered in
+        one pass rather than shifted once per object.
+        """
+        s_class = cls.__name__
+        objs = list(objs)
+        with _lock(s_class).write:
+            if len(objs) <= SCAN_BULK_MIN:
+                removed = [obj for obj in objs
+                           if self._discard(s_class, obj)]
+            else:
+                sorted_indexes = SORTED_INDEXES.pop(s_class, None)
+                order = ORDERS.pop(s_class, None)
+                removed = [obj for obj in objs
+                           if self._discard(s_class, obj)]
+                gone = {obj.id for obj in removed}
+                if sorted_indexes is not None:
+                    for sorted_index in sorted_indexes.values():
+                        if sorted_index is None:
+                            continue
+                        keys, ids = sorted_index
+                        kept = [i for i, obj_id in enumerate(ids)
+                                if obj_id not in gone]
+                        keys[:] = [keys[i] for i in kept]
+                        ids[:] = [ids[i] for i in kept]
+                    SORTED_INDEXES[s_class] = sorted_indexes
+                if order is not None:
+                    order[:] = [obj_id for obj_id in order
+                                if obj_id not in gone]
+                    ORDERS[s_class] = order
+            if removed:
+                self.delete_many(cls, removed)
+        return len(removed)
+
+    def count(self, cls) -> int:
+        """ Number of objects of a class
+        """
+        s_class = cls.__name__
+        with _lock(s_class).read:
+            return len(DATA[s_class])
+
+    @staticmethod
+    def _order(cls) -> List[str]:
+        """ IDs of the objects of a class in sorted order, built on first
+        use and then kept up to date by save() and remove(). The caller
+        holds the lock of the class.
+        """
+        s_class = cls.__name__
+        order = ORDERS.get(s_class)
+        if order is None:
+            objs = DATA[s_class]
+            if isinstance(objs, LazyObjects):
+                order = sorted(objs.ids())
+            else:
+                order = sorted(objs)
+            ORDERS[s_class] = order
+        return order
+
+    def page(self, cls, after: str = None, limit: int = None) -> list:
+        """ Objects of a class in ID order, starting right after the ID
+        after and at most limit of them
+        """
+        s_class = cls.__name__
+        with _lock(s_class).read:
+            order = self._order(cls)
+            start = 0 if after is None else bisect_right(order, after)
+            end = None if limit is None else start + limit
+            objs = DATA[s_class]
+            page = []
+            for obj_id in order[start:end]:
+                obj = objs.get(obj_id)
+                if obj is not None:
+                    page.append(obj)
+        return page
+
+    def get(self, cls, obj_id: str):
+        """ Object of a class by ID
+        """
+        s_class = cls.__name__
+        with _lock(s_class).read:
+            return DATA[s_class].get(obj_id)
+
+    @staticmethod
+    def _sorted_index(cls, attr: str):
+        """ Sorted index of an attribute of a class: its values in order
+        and the IDs alongside. It is built on first use and then kept up
+        to date by Base; None when the attribute isn't listed in
+        __sorted_indexes__ or has values that don't compare. The caller
+        holds the lock of the class.
+        """
+        if attr not in cls.__sorted_indexes__:
+            return None
+        s_class = cls.__name__
+        sorted_indexes = SORTED_INDEXES.setdefault(s_class, {})
+        if attr in sorted_indexes:
+            return sorted_indexes[attr]
+        objs = DATA[s_class]
+        if isinstance(objs, LazyObjects):
+            pairs = objs.values_of(attr)
+        else:
+            pairs = [(getattr(obj, attr, None), obj_id)
+                     for obj_id, obj in objs.items()]
+        pairs = [pair for pair in pairs if pair[0] is not None]
+        try:
+            pairs.sort(key=itemgetter(0))
+            sorted_index = ([value for value, _ in pairs],
+                            [obj_id for _, obj_id in pairs])
+        except TypeError:
+            sorted_index = None
+        sorted_indexes[attr] = sorted_index
+        return sorted_index
+
+    def _plans(self, cls, predicates: list) -> list:
+        """ (size, attribute, ids, bounds) of each predicate an index can
+        answer: its candidates are ids, or ids[lo:hi] when they come in
+        the order of the attribute from sorted index bounds (lo, hi)
+        """
+        plans = []
+        indexes = cls._indexes()
+        for attr, op, probe in predicates:
+            try:
+                if op in ('eq', 'in') and (attr == 'id' or attr in indexes):
+                    values = [probe] if op == 'eq' else dict.fromkeys(probe)
+                    if attr == 'id':
+                        ids = list(values)
+                    else:
+                        ids = [obj_id for value in values
+                               for obj_id in _index_get(indexes[attr], value)]
+                    plans.append((len(ids), attr, ids, None))
+                    continue
+                sorted_index = self._sorted_index(cls, attr)
+                if sorted_index is None:
+                    continue
+                bounds = _sorted_range(sorted_index[0], op, probe)
+            except TypeError:
+                continue
+            if bounds is not None:
+                plans.append((bounds[1] - bounds[0], attr, sorted_index[1],
+                              bounds))
+        return plans
+
+    @staticmethod
+    def _matching(objs: dict, predicates: list,
+                  ids: Iterable[str] = None) -> Iterator:
+        """ Objects satisfying the predicates, among ids or all of them
+        """
+        if isinstance(objs, LazyObjects):
+            return objs.matching(predicates, ids)
+        if ids is None:
+            candidates = objs.values()
+        else:
+            candidates = (objs.get(obj_id) for obj_id in ids)
+        return (obj for obj in candidates
+                if obj is not None and _matches(obj, predicates))
+
+    def search(self, cls, attributes: dict, limit: int = None,
+               order_by: str = None) -> list:
+        """ Objects of a class with matching attributes, at most limit of
+        them, ordered by the attribute order_by ('-attribute' for the
+        descending order). The candidates come from the index giving the
+        fewest of them, or from a scan. When order_by has a sorted index
+        that the plan walks, the search stops after limit matches.
+        """
+        predicates = _predicates(attributes)
+        reverse = order_by is not None and order_by[0] == '-'
+        order_attr = order_by[1:] if reverse else order_by
+        s_class = cls.__name__
+        with _lock(s_class).read:
+            objs = DATA[s_class]
+            plans = self._plans(cls, predicates)
+            ids = None
+            if plans:
+                size, attr, ids, bounds = min(plans, key=itemgetter(0))
+                if bounds is not None:
+                    ids = ids[bounds[0]:bounds[1]]
+                    if attr == order_attr:
+                        if reverse:
+                            ids = reversed(ids)
+                        return list(islice(
+                            self._matching(objs, predicates, ids), limit))
+            elif limit is not None and order_attr is not None:
+                walk = self._sorted_index(cls, order_attr)
+                if walk is not None:
+                    return self._walk(objs, predicates, walk, order_attr,
+                                      reverse, limit)
+            if limit is not None and order_attr is None or \
+                    ids is not None and len(ids) <= SCAN_BULK_MIN or \
+                    isinstance(objs, LazyObjects):
+                found = self._matching(objs, predicates, ids)
+                if order_attr is None:
+                    return list(islice(found, limit))
+            else:
+                if ids is None:
+                    found = list(objs.values())
+                else:
+                    found = [obj for obj in map(objs.get, ids)
+                             if obj is not None]
+                for predicate in predicates:
+                    found = _filter(found, predicate)
+            if order_attr is not None:
+                found = _sorted_by(found, order_attr, reverse)
+            return found[:limit]
+
+    def _walk(self, objs: dict, predicates: list, walk: tuple,
+              order_attr: str, reverse: bool, limit: int) -> list:
+        """ The first limit objects satisfying the predicates, walking
+        the sorted index of order_attr; the objects without a value come
+        last
+        """
+        ids = reversed(walk[1]) if reverse else walk[1]
+        found = list(islice(self._matching(objs, predicates, ids), limit))
+        if len(found) < limit and len(walk[1]) < len(objs):
+            missing = predicates + [(order_attr, 'eq', None)]
+            found.extend(islice(self._matching(objs, missing),
+                                limit - len(found)))
+        return found
+
+    def flush(self, cls=None):
+        """ Write the pending changes of a class, or of all classes
+        """
+        pass
+
+    def close(self):
+        """ Finish pending work before the process exits
+        """
+        pass
+
+
+class JournalStorage(FileStorage):
+    """ Storage appending put/delete operations to .db_<Class>.journal,
+    one JSON document per line. Every JOURNAL_COMPACT_EVERY operations
+    the journal is folded into the .db_<Class>.json snapshot by a
+    background thread.
+    """
+
+    def __init__(self):
+        """ Initialize the journals
+        """
+        super().__init__()
+        self.lock = threading.Lock()
+        self.files = {}
+        self.counts = {}
+        self.compacting = {}
+
+    def journal_path(self, s_class: str) -> str:
+        """ Path of the journal of a class
+        """
+        return ".db_{}.journal".format(s_class)
+
+    def load(self, cls) -> dict:
+        """ Replay the journal over the snapshot. A journal left over by
+        an interrupted compaction (.old) is replayed first.
+        """
+        s_class = cls.__name__
+        objs_json = super().load(cls)
+        journal_path = self.journal_path(s_class)
+        count = 0
+        for file_path in ("{}.old".format(journal_path), journal_path):
+            if path.exists(file_path):
+                count += self._replay(file_path, objs_json)
+        with self.lock:
+            self.counts[s_class] = count
+        return objs_json
+
+    @staticmethod
+    def _replay(file_path: str, objs_json: dict) -> int:
+        """ Apply the operations of a journal file, stopping at a torn
+        last line. Return the number of operations applied.
+        """
+        count = 0
+        with open(file_path, 'r') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break
+                if entry['op'] == 'put':
+                    objs_json[entry['id']] = entry['obj']
+                else:
+                    objs_json.pop(entry['id'], None)
+                count += 1
+        return count
+
+    def put(self, obj):
+        """ Append the new state of an object
+        """
+        self._append(obj.__class__, {'op': 'put', 'id': obj.id,
+                                     'obj': obj.to_json(True)})
+
+    def delete(self, obj):
+        """ Append the removal of an object
+        """
+        self._append(obj.__class__, {'op': 'delete', 'id': obj.id})
+
+    def delete_many(self, cls, objs: list):
+        """ Append the removals of several objects in one write
+        """
+        self._append(cls, *({'op': 'delete', 'id': obj.id} for obj in objs))
+
+    def _append(self, cls, *entries: dict):
+        """ Write operations to the journal of a class
+        """
+        s_class = cls.__name__
+        lines = "".join("{}\n".format(json.dumps(entry))
+                        for entry in entries)
+        with self.lock:
+            f = self.files.get(s_class)
+            if f is None:
+                f = open(self.journal_path(s_class), 'a')
+                self.files[s_class] = f
+            f.write(lines)
+            f.flush()
+            self.counts[s_class] = (self.counts.get(s_class, 0) +
+                                    len(entries))
+            due = self.counts[s_class] >= JOURNAL_COMPACT_EVERY
+        if due:
+            self.compact(cls)
+
+    def dump(self, cls):
+        """ Fold the journal into the snapshot right away
+        """
+        self.compact(cls, background=False)
+
+    def compact(self, cls, background: bool = True):
+        """ Write a snapshot of the objects of a class and drop the
+        journal it covers. The journal is set aside as .old first, so
+        writes go on in a fresh journal while the snapshot is written.
+        """
+        s_class = cls.__name__
+        journal_path = self.journal_path(s_class)
+        old_path = "{}.old".format(journal_path)
+        with _lock(s_class).read, self.lock:
+            if s_class in self.compacting:
+                return
+            self.compacting[s_class] = None
+            f = self.files.pop(s_class, None)
+            if f is not None:
+                f.close()
+            if path.exists(journal_path):
+                if path.exists(old_path):
+                    with open(journal_path, 'r') as src, \
+                            open(old_path, 'a') as dst:
+                        dst.write(src.read())
+                    os.remove(journal_path)
+                else:
+                    os.replace(journal_path, old_path)
+            self.counts[s_class] = 0
+            objs = _snapshot(DATA[s_class])
+
+        def run():
+            try:
+                _write_json(self.file_path(s_class), _serialize(objs))
+                if path.exists(old_path):
+                    os.remove(old_path)
+            finally:
+                with self.lock:
+                    self.compacting.pop(s_class, None)
+
+        if background:
+            thread = threading.Thread(target=run, daemon=True)
+            with self.lock:
+                self.compacting[s_class] = thread
+            thread.start()
+        else:
+            run()
+
+    def close(self):
+        """ Wait for running compactions and close the journals
+        """
+        with self.lock:
+            threads = list(self.compacting.values())
+        for thread in threads:
+            if thread is not None:
+                thread.join()
+        with self.lock:
+            for f in self.files.values():
+                f.close()
+            self.files.clear()
+
+
+def _index_add(index: dict, value, obj_id: str):
+    """ Add an object ID under a value of a hash index. A value held by
+    a single object maps to its ID, by several to a dict of their IDs.
+    """
+    try:
+        ids = index.get(value)
+    except TypeError:
+        return
+    if ids is None:
+        index[value] = obj_id
+    elif type(ids) is dict:
+        ids[obj_id] = None
+    elif ids != obj_id:
+        index[value] = {ids: None, obj_id: None}
+
+
+def _index_discard(index: dict, value, obj_id: str):
+    """ Remove an object ID from under a value of a hash index
+    """
+    try:
+        ids = index.get(value)
+    except TypeError:
+        return
+    if ids is None:
+        return
+    if type(ids) is dict:
+        ids.pop(obj_id, None)
+        if not ids:
+            del index[value]
+    elif ids == obj_id:
+        del index[value]
+
+
+def _index_get(index: dict, value) -> List[str]:
+    """ IDs of the objects under a value of a hash index
+    """
+    ids = index.get(value)
+    if ids is None:
+        return []
+    if type(ids) is dict:
+        return list(ids)
+    return [ids]
+
+
+def _sorted_add(sorted_index: tuple, value, obj_id: str):
+    """ Insert an object ID at the place of its value in a sorted index
+    """
+    if value is None:
+        return
+    keys, ids = sorted_index
+    i = bisect_right(keys, value)
+    keys.insert(i, value)
+    ids.insert(i, obj_id)
+
+
+def _sorted_discard(sorted_index: tuple, value, obj_id: str):
+    """ Remove an object ID from a sorted index
+    """
+    if value is None:
+        return
+    keys, ids = sorted_index
+    try:
+        lo = bisect_left(keys, value)
+        hi = bisect_right(keys, value)
+    except TypeError:
+        return
+    for i in range(lo, hi):
+        if ids[i] == obj_id:
+            del keys[i]
+            del ids[i]
+            return
+
+
+def _sorted_range(keys: list, op: str, probe):
+    """ Bounds of the keys of a sorted index satisfying a predicate, None
+    when the index can't answer it
+    """
+    if probe is None:
+        return None
+    if op == 'eq':
+        return bisect_left(keys, probe), bisect_right(keys, probe)
+    if op == 'gt':
+        return bisect_right(keys, probe), len(keys)
+    if op == 'lt':
+        return 0, bisect_left(keys, probe)
+    if op == 'startswith' and type(probe) is str:
+        end = _prefix_end(probe)
+        hi = len(keys) if end is None else bisect_left(keys, end)
+        return bisect_left(keys, probe), hi
+    return None
+
+
+class WriteBehindStorage(FileStorage):
+    """ Storage that only marks a class dirty on change. A background
+    thread coalesces the changes into one .db_<Class>.json write, at
+    most WRITE_BEHIND_MS milliseconds after the first pending change or
+    as soon as WRITE_BEHIND_OPS changes are pending.
+    """
+
+    def __init__(self, interval_ms: int = WRITE_BEHIND_MS,
+                 max_ops: int = WRITE_BEHIND_OPS):
+        """ Initialize the dirty set, the flusher starts on first change
+        """
+        super().__init__()
+        self.interval = interval_ms / 1000
+        self.max_ops = max_ops
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.dirty = {}
+        self.pending = 0
+        self.thread = None
+
+    def put(self, obj):
+        """ Mark the class of a new or updated object dirty
+        """
+        self._mark(obj.__class__)
+
+    def delete(self, obj):
+        """ Mark the class of a removed object dirty
+        """
+        self._mark(obj.__class__)
+
+    def delete_many(self, cls, objs: list):
+        """ Mark the class of removed objects dirty
+        """
+        self._mark(cls)
+
+    def _mark(self, cls):
+        """ Record a pending change and wake the flusher if needed
+        """
+        with self.condition:
+            self.dirty[cls.__name__] = cls
+            self.pending += 1
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run,
+                                               daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        """ Flusher loop: wait for a change, let a burst build up, write.
+        A failed write is logged and retried after the next interval.
+        """
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.dirty)
+                self.condition.wait_for(
+                    lambda: self.pending >= self.max_ops,
+                    timeout=self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("write-behind flush failed, retrying")
+
+    def dump(self, cls):
+        """ Write a class right away
+        """
+        with self.condition:
+            self.dirty.pop(cls.__name__, None)
+        with self.write_lock:
+            self._write_all([cls])
+
+    def flush(self, cls=None):
+        """ Write the pending changes of a class, or of all classes
+        """
+        with self.condition:
+            if cls is None:
+                classes = list(self.dirty.values())
+                self.dirty.clear()
+                self.pending = 0
+            elif self.dirty.pop(cls.__name__, None) is not None:
+                classes = [cls]
+            else:
+                classes = []
+        with self.write_lock:
+            self._write_all(classes)
+
+    def _write_all(self, classes: list):
+        """ Write classes in turn. The classes whose write fails are
+        marked dirty again, so that the next flush retries them, and the
+        first error is raised once the others are written. The caller
+        holds write_lock.
+        """
+        failed = []
+        error = None
+        for cls in classes:
+            try:
+                self._write(cls)
+            except Exception as e:
+                failed.append(cls)
+                error = error or e
+        if failed:
+            with self.condition:
+                for cls in failed:
+                    self.dirty.setdefault(cls.__name__, cls)
+            raise error
+
+    def _write(self, cls):
+        """ Write a class from a snapshot, so that writers only wait for
+        the copy and not for the file. The caller holds write_lock.
+        """
+        s_class = cls.__name__
+        with _lock(s_class).read:
+            objs = _snapshot(DATA[s_class])
+        _write_json(self.file_path(s_class), _serialize(objs))
+
+    def close(self):
+        """ Write everything still pending
+        """
+        self.flush()
+
+
+def _column_value(value):
+    """ Value of an indexed attribute as stored in its SQLite column
+    """
+    if value is None or type(value) in (str, int, float):
+        return value
+    if type(value) is datetime:
+        return _format_timestamp(value)
+    return json.dumps(value)
+
+
+def _sql_value(probe):
+    """ Column value to compare a search value with, TypeError when
+    SQLite wouldn't compare it the way Python does
+    """
+    if type(probe) in (str, int, float):
+        return probe
+    if type(probe) is datetime and not probe.microsecond:
+        return _format_timestamp(probe)
+    raise TypeError(probe)
+
+
+def _sql_predicate(column: str, op: str, probe):
+    """ SQL condition and parameters of a predicate on a column, None
+    when SQLite can't evaluate it the way Python does
+    """
+    name = '"{}"'.format(column)
+    try:
+        if op == 'eq':
+            if probe is None:
+                return name + " IS NULL", []
+            return name + " = ?", [_sql_value(probe)]
+        if op in ('gt', 'lt'):
+            sign = '>' if op == 'gt' else '<'
+            return "{} {} ?".format(name, sign), [_sql_value(probe)]
+        if op == 'in':
+            values = [_sql_value(value) for value in probe]
+            return "{} IN ({})".format(name, ', '.join('?' * len(values))), \
+                values
+    except TypeError:
+        return None
+    if op == 'startswith' and type(probe) is str and probe:
+        end = _prefix_end(probe)
+        if end is not None:
+            return "{0} >= ? AND {0} < ?".format(name), [probe, end]
+    return None
+
+
+class SQLiteStorage(FileStorage):
+    """ Storage keeping the objects in a SQLite database in WAL mode,
+    which all the processes opening the same file share: nothing is
+    kept in DATA and every lookup reads the database.
+
+    Each class has its own table holding the JSON dictionary of each
+    object, plus one indexed column per attribute of __indexes__. The
+    .db_<Class>.json file of a class is imported when its table is
+    created.
+    """
+
+    def __init__(self, db_path: str = SQLITE_PATH,
+                 timeout_ms: int = SQLITE_TIMEOUT_MS):
+        """ Initialize the storage, connections are opened on demand
+        """
+        super().__init__()
+        self.db_path = db_path
+        self.timeout_ms = timeout_ms
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        self.tables = {}
+
+    def connection(self) -> sqlite3.Connection:
+        """ Connection of the current thread, in autocommit mode. A
+        process started by fork opens its own.
+        """
+        pid = os.getpid()
+        conn = getattr(self.local, 'conn', None)
+        if conn is None or self.local.pid != pid:
+            conn = sqlite3.connect(self.db_path,
+                                   timeout=self.timeout_ms / 1000,
+                                   isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout = {:d}".format(
+                self.timeout_ms))
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self.local.conn = conn
+            self.local.pid = pid
+            with self.lock:
+                self.connections.append((pid, conn))
+        return conn
+
+    def table(self, cls) -> str:
+        """ Name of the table of a class, created (and filled from the
+        JSON file) on first use, and given the columns of attributes
+        added to __indexes__ or __sorted_indexes__ since
+        """
+        s_class = cls.__name__
+        indexed = self._columns(cls)
+        if self.tables.get(s_class) == indexed:
+            return s_class
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = [row[1] for row in conn.execute(
+                'PRAGMA table_info("{}")'.format(s_class))]
+            created = not columns
+            if created:
+                conn.execute('CREATE TABLE "{}" (id TEXT PRIMARY KEY, '
+                             'data TEXT NOT NULL)'.format(s_class))
+            for attr in indexed:
+                if attr in columns:
+                    continue
+                conn.execute('ALTER TABLE "{}" ADD COLUMN "{}"'.format(
+                    s_class, attr))
+                conn.execute('UPDATE "{0}" SET "{1}" = json_extract(data, '
+                             "'$.{1}')".format(s_class, attr))
+                conn.execute('CREATE INDEX "{0}_{1}" ON "{0}" ("{1}")'
+                             .format(s_class, attr))
+            if created:
+                conn.executemany(self._upsert_sql(cls),
+                                 (self._row(cls(**obj_json))
+                                  for obj_json in self.load(cls).values()))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.tables[s_class] = indexed
+        return s_class
+
+    @staticmethod
+    def _columns(cls) -> tuple:
+        """ Attributes of a class having an indexed column
+        """
+        return tuple(dict.fromkeys(cls.__indexes__ + cls.__sorted_indexes__))
+
+    def _upsert_sql(self, cls) -> str:
+        """ Statement inserting or replacing an object of a class
+        """
+        indexed = self._columns(cls)
+        columns = ''.join(', "{}"'.format(a) for a in indexed)
+        return 'INSERT OR REPLACE INTO "{}" (id, data{}) VALUES ({})'.format(
+            cls.__name__, columns, ', '.join('?' * (len(indexed) + 2)))
+
+    def _row(self, obj) -> tuple:
+        """ Values of the columns of an object
+        """
+        return (obj.id, json.dumps(obj.to_json(True))) + tuple(
+            _column_value(getattr(obj, attr, None))
+            for attr in self._columns(obj.__class__))
+
+    def _objects(self, cls, sql: str, params=()) -> list:
+        """ Objects of a class built from the data column of a query
+        """
+        rows = self.connection().execute(sql, params)
+        return [cls(**json.loads(data)) for data, in rows]
+
+    def reload(self, cls):
+        """ Make sure the table of a class exists: the database is
+        always current, there is nothing to reload
+        """
+        self.table(cls)
+
+    def put(self, obj):
+        """ Insert or replace an object
+        """
+        self.table(obj.__class__)
+        self.connection().execute(self._upsert_sql(obj.__class__),
+                                  self._row(obj))
+
+    def delete(self, obj):
+        """ Delete an object
+        """
+        table = self.table(obj.__class__)
+        self.connection().execute(
+            'DELETE FROM "{}" WHERE id = ?'.format(table), (obj.id,))
+
+    def remove_many(self, cls, objs: Iterable) -> int:
+        """ Delete objects of a class in one transaction and return the
+        number of objects deleted
+        """
+        table = self.table(cls)
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            removed = conn.executemany(
+                'DELETE FROM "{}" WHERE id = ?'.format(table),
+                ((obj.id,) for obj in objs)).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return removed
+
+    save = put
+    remove = delete
+
+    def dump(self, cls):
+        """ Checkpoint the write-ahead log into the database file
+        """
+        self.table(cls)
+        self.connection().execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def count(self, cls) -> int:
+        """ Number of objects of a class
+        """
+        table = self.table(cls)
+        return self.connection().execute(
+            'SELECT COUNT(*) FROM "{}"'.format(table)).fetchone()[0]
+
+    def page(self, cls, after: str = None, limit: int = None) -> list:
+        """ Objects of a class in ID order, starting right after the ID
+        after and at most limit of them
+        """
+        table = self.table(cls)
+        return self._objects(
+            cls, 'SELECT data FROM "{}" WHERE id > ? ORDER BY id '
+            'LIMIT ?'.format(table),
+            ('' if after is None else after, -1 if limit is None else limit))
+
+    def get(self, cls, obj_id: str):
+        """ Object of a class by ID
+        """
+        table = self.table(cls)
+        objs = self._objects(
+            cls, 'SELECT data FROM "{}" WHERE id = ?'.format(table),
+            (obj_id,))
+        return objs[0] if objs else None
+
+    def search(self, cls, attributes: dict, limit: int = None,
+               order_by: str = None) -> list:
+        """ Objects of a class with matching attributes, at most limit of
+        them, ordered by the attribute order_by ('-attribute' for the
+        descending order). The predicates and the order on indexed
+        columns are left to SQLite, the others are applied to the rows
+        it returns.
+        """
+        table = self.table(cls)
+        columns = ('id',) + self._columns(cls)
+        where = []
+        params = []
+        others = []
+        for attr, op, probe in _predicates(attributes):
+            clause = None
+            if attr in columns:
+                clause = _sql_predicate(attr, op, probe)
+            if clause is None:
+                others.append((attr, op, probe))
+            else:
+                where.append(clause[0])
+                params.extend(clause[1])
+        reverse = order_by is not None and order_by[0] == '-'
+        order_attr = order_by[1:] if reverse else order_by
+        sql_order = order_attr is None or order_attr in columns
+        sql = 'SELECT data FROM "{}"'.format(table)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if order_attr is not None and sql_order:
+            sql += ' ORDER BY "{0}" IS NULL, "{0}"{1}'.format(
+                order_attr, " DESC" if reverse else "")
+        if limit is not None and sql_order and not others:
+            sql += " LIMIT ?"
+            params.append(limit)
+        found = self._rows_matching(
+            cls, self.connection().execute(sql, params), others)
+        if not sql_order:
+            found = _sorted_by(found, order_attr, reverse)
+        return list(islice(found, limit))
+
+    @staticmethod
+    def _rows_matching(cls, rows: Iterable, predicates: list) -> Iterator:
+        """ Objects of a class built from the data column of rows, when
+        they satisfy the predicates. The rows are prefiltered on their
+        stored keys, predicates on other attributes (e.g. a property)
+        are tested on the built object.
+        """
+        for data, in rows:
+            obj_json = json.loads(data)
+            if not _matches_json(obj_json, predicates):
+                continue
+            obj = cls(**obj_json)
+            if _matches(obj, predicates):
+                yield obj
+
+    def close(self):
+        """ Close the connections this process opened
+        """
+        pid = os.getpid()
+        with self.lock:
+            for conn_pid, conn in self.connections:
+                if conn_pid == pid:
+                    conn.close()
+            self.connections = []
+
+
+STORAGES = {
+    'file': FileStorage,
+    'journal': JournalStorage,
+    'write_behind': WriteBehindStorage,
+    'sqlite': SQLiteStorage,
+}
+storage = STORAGES[getenv('BASE_STORAGE', 'file')]()
+atexit.register(storage.close)
+CLASS_STORAGES = {}
+CLASS_STORAGES_LOCK = threading.Lock()
+
+
+def _storage(cls) -> FileStorage:
+    """ Storage of a class: the one named by its __storage__ when the
+    process uses the plain file storage, the process storage otherwise.
+    Each named storage is created once and shared by all the classes
+    naming it.
+    """
+    name = cls.__storage__
+    if name is None or type(storage) is not FileStorage:
+        return storage
+    found = CLASS_STORAGES.get(name)
+    if found is None:
+        with CLASS_STORAGES_LOCK:
+            found = CLASS_STORAGES.get(name)
+            if found is None:
+                found = STORAGES[name]()
+                atexit.register(found.close)
+                CLASS_STORAGES[name] = found
+    return found
 
 
 class Base():
     """ Base class
+
+    Instances are slotted: subclasses declare their attributes in
+    __slots__, and __fields__ lists all of them in serialization order.
+    Subclasses list in __indexes__ the attributes that search() should
+    answer from a hash index instead of a scan, in __sorted_indexes__
+    the ones worth a sorted index for range predicates and ordering, and
+    in __interned__ the string attributes worth sharing between
+    instances. __timestamps__ lists the datetime attributes.
+    __storage__ names the storage of STORAGES persisting the class in
+    place of the default file storage, e.g. 'write_behind' for a class
+    changing too often to rewrite its whole file each time.
     """
+    __slots__ = ('id', 'created_at', 'updated_at')
+    __fields__ = __slots__
+    __public_fields__ = __slots__
+    __timestamps__ = ('created_at', 'updated_at')
+    __indexes__ = ()
+    __sorted_indexes__ = ()
+    __interned__ = ()
+    __storage__ = None
+
+    def __init_subclass__(cls, **kwargs):
+        """ Collect the slots of the class hierarchy into __fields__, and
+        the ones to_json shows by default into __public_fields__
+        """
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            for name in klass.__dict__.get('__slots__', ()):
+                if name not in fields:
+                    fields.append(name)
+        cls.__fields__ = tuple(fields)
+        cls.__public_fields__ = tuple(f for f in fields if f[0] != '_')
 
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
         s_class = str(self.__class__.__name__)
         if DATA.get(s_class) is None:
-            DATA[s_class] = {}
+            DATA.setdefault(s_class, {})
 
         self.id = kwargs.get('id', str(uuid.uuid4()))
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = _parse_timestamp(kwargs.get('created_at'))
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = _parse_timestamp(kwargs.get('updated_at'))
         else:
             self.updated_at = datetime.utcnow()
 
+    def __setattr__(self, name: str, value):
+        """ Set an attribute, interning it if declared so and keeping
+        the indexes of a stored object up to date
+        """
+        if name in self.__interned__ and type(value) is str:
+            value = sys.intern(value)
+        if name not in self.__indexes__ and \
+                name not in self.__sorted_indexes__ or \
+                not self._is_stored():
+            object.__setattr__(self, name, value)
+            return
+        s_class = self.__class__.__name__
+        with _lock(s_class).write:
+            self._unindex(name)
+            object.__setattr__(self, name, value)
+            self._index(name)
+
+    def _is_stored(self) -> bool:
+        """ Whether this instance is the one held in DATA
+        """
+        objs = DATA.get(self.__class__.__name__)
+        obj_id = getattr(self, 'id', None)
+        return objs is not None and dict.get(objs, obj_id) is self
+
+    @classmethod
+    def _indexes(cls) -> dict:
+        """ Hash indexes of the class: attribute -> value -> ID(s)
+        """
+        s_class = cls.__name__
+        indexes = INDEXES.get(s_class)
+        if indexes is None:
+            indexes = {attr: {} for attr in cls.__indexes__}
+            INDEXES[s_class] = indexes
+        return indexes
+
+    def _index(self, name: str = None):
+        """ Add this object to the indexes of its class, or to the ones
+        of the attribute name
+        """
+        for attr, index in self.__class__._indexes().items():
+            if name is None or attr == name:
+                _index_add(index, getattr(self, attr, None), self.id)
+        sorted_indexes = SORTED_INDEXES.get(self.__class__.__name__, {})
+        for attr, sorted_index in sorted_indexes.items():
+            if sorted_index is None or name is not None and attr != name:
+                continue
+            try:
+                _sorted_add(sorted_index, getattr(self, attr, None), self.id)
+            except TypeError:
+                sorted_indexes[attr] = None
+
+    def _unindex(self, name: str = None):
+        """ Remove this object from the indexes of its class, or from the
+        ones of the attribute name
+        """
+        for attr, index in self.__class__._indexes().items():
+            if name is None or attr == name:
+                _index_discard(index, getattr(self, attr, None), self.id)
+        sorted_indexes = SORTED_INDEXES.get(self.__class__.__name__, {})
+        for attr, sorted_index in sorted_indexes.items():
+            if sorted_index is None or name is not None and attr != name:
+                continue
+            _sorted_discard(sorted_index, getattr(self, attr, None), self.id)
+
     def __eq__(self, other: TypeVar('Base')) -> bool:
         """ Equality
         """
@@ -47,66 +1630,97 @@ class Base():
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
-        result = {}
-        for key, value in self.__dict__.items():
-            if not for_serialization and key[0] == '_':
-                continue
-            if type(value) is datetime:
-                result[key] = value.strftime(TIMESTAMP_FORMAT)
-            else:
+        return Base.to_json_many((self,), for_serialization)[0]
+
+    @staticmethod
+    def to_json_many(objs: Iterable[TypeVar('Base')],
+                     for_serialization: bool = False,
+                     only: Iterable[str] = None) -> List[dict]:
+        """ Convert objects to JSON dictionaries in bulk, looking the
+        field list up once per class instead of once per object.
+        only restricts the output to some of the fields. Attributes a
+        subclass without __slots__ sets on its instances follow the
+        declared fields.
+        """
+        if only is not None:
+            only = set(only)
+        results = []
+        klass = None
+        fields = ()
+        has_dict = False
+        for obj in objs:
+            if obj.__class__ is not klass:
+                klass = obj.__class__
+                if for_serialization:
+                    fields = klass.__fields__
+                else:
+                    fields = klass.__public_fields__
+                if only is not None:
+                    fields = tuple(f for f in fields if f in only)
+                has_dict = klass.__dictoffset__ != 0
+            result = {}
+            for key in fields:
+                try:
+                    value = getattr(obj, key)
+                except AttributeError:
+                    continue
+                if type(value) is datetime:
+                    value = _format_timestamp(value)
                 result[key] = value
-        return result
+            if has_dict:
+                for key, value in obj.__dict__.items():
+                    if key in result or only is not None and \
+                            key not in only or \
+                            not for_serialization and key[0] == '_':
+                        continue
+                    if type(value) is datetime:
+                        value = _format_timestamp(value)
+                    result[key] = value
+            results.append(result)
+        return results
 
     @classmethod
     def load_from_file(cls):
-        """ Load all objects from file
+        """ Load all objects from file. In lazy mode (BASE_LAZY_LOAD) the
+        objects are only built when get() or search() hits them.
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
-
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+        _storage(cls).reload(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
+        _storage(cls).dump(cls)
 
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+    @classmethod
+    def flush(cls):
+        """ Write the changes the storage still holds back
+        """
+        _storage(cls).flush(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        _storage(self.__class__).save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        _storage(self.__class__).remove(self)
+
+    @classmethod
+    def remove_many(cls, objs: Iterable[TypeVar('Base')]) -> int:
+        """ Remove objects of the class, persisting all the removals at
+        once, and return the number of objects removed
+        """
+        return _storage(cls).remove_many(cls, objs)
 
     @classmethod
     def count(cls) -> int:
         """ Count all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return _storage(cls).count(cls)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -114,24 +1728,26 @@ class Base():
         """
         return cls.search()
 
+    @classmethod
+    def page(cls, after: str = None,
+             limit: int = None) -> List[TypeVar('Base')]:
+        """ Objects in ID order, starting right after the ID after and
+        at most limit of them
+        """
+        return _storage(cls).page(cls, after, limit)
+
     @classmethod
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return _storage(cls).get(cls, id)
 
     @classmethod
-    def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
-        """ Search all objects with matching attributes
+    def search(cls, attributes: dict = {}, limit: int = None,
+               order_by: str = None) -> List[TypeVar('Base')]:
+        """ Search all objects with matching attributes. A key can carry
+        an operator: attribute__gt, __lt, __in, __startswith or
+        __endswith. At most limit objects are returned, ordered by the
+        attribute order_by ('-attribute' for the descending order).
         """
-        s_class = cls.__name__
-        def _search(obj):
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
-        
-        return list(filter(_search, DATA[s_class].values()))
+        return _storage(cls).search(cls, attributes, limit, order_by)
@@ -5,23 +5,101 @@ authentication in an API
 """
 
 from flask import request
-from typing import List
+from functools import lru_cache
+from typing import Iterable, List, Union
 import os
 
 
+class PathMatcher:
+    """
+    Compiled set of excluded paths.
+
+    Exact paths are kept in a set, compared slash-tolerantly, and the
+    prefixes of paths ending with '*' in a character trie, so a lookup
+    costs the same whatever the number of patterns.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        """
+        Compile the patterns.
+
+        Args:
+            patterns (iterable): Excluded paths, a trailing '*' matching
+            any path starting with what precedes it.
+        """
+        self.exact = set()
+        self.trie = {}
+        for pattern in patterns:
+            self.add(pattern)
+
+    def add(self, pattern: str):
+        """
+        Add an excluded path.
+
+        Args:
+            pattern (str): The path, or a prefix followed by '*'.
+        """
+        if pattern.endswith('*'):
+            node = self.trie
+            for char in pattern[:-1]:
+                node = node.setdefault(char, {})
+            node[None] = True
+        else:
+            self.exact.add(pattern.rstrip('/') + '/')
+
+    def match(self, path: str) -> bool:
+        """
+        Determine if a path is excluded.
+
+        Args:
+            path (str): The path of the request.
+
+        Returns:
+        bool: True if the path matches one of the patterns.
+        """
+        path = path.rstrip('/') + '/'
+        if path in self.exact:
+            return True
+        node = self.trie
+        for char in path:
+            if None in node:
+                return True
+            node = node.get(char)
+            if node is None:
+                return False
+        return None in node
+
+
+@lru_cache(maxsize=32)
+def compile_paths(patterns: tuple) -> PathMatcher:
+    """
+    Compile a tuple of excluded paths, once per distinct tuple.
+
+    Args:
+        patterns (tuple): Excluded paths.
+
+    Returns:
+    PathMatcher: The compiled matcher.
+    """
+    return PathMatcher(patterns)
+
+
 class Auth:
     """
     Auth class for managing API authentication.
     """
 
-    def require_auth(self, path: str, excluded_paths: List[str]) -> bool:
+    def require_auth(self, path: str,
+                     excluded_paths: Union[List[str], PathMatcher]) -> bool:
         """
         Determine if authentication is required for a given path.
 
         Args:
             path (str): The path of the request.
-            excluded_paths (list): List of paths that do not require
-            authentication.
+            excluded_paths (list or PathMatcher): Paths that do not
+            require authentication, a trailing '*' matching any path
+            starting with what precedes it. A list is compiled on first
+            use.
 
         Returns:
         bool: True if authentication is required, False otherwise.
@@ -29,14 +107,10 @@ class Auth:
         if not path or not excluded_paths:
             return True
 
-        path = path.rstrip('/') + '/'
-
-        for excluded_path in excluded_paths:
-            if path == excluded_path or path.startswith(
-                    excluded_path + "*"):
-                return False
+        if not isinstance(excluded_paths, PathMatcher):
+            excluded_paths = compile_paths(tuple(excluded_paths))
 
-        return True
+        return not excluded_paths.match(path)
 
     def authorization_header(self, request=None) -> str:
         """
@@ -5,13 +5,20 @@ creating a new authentication mechanism
 
 import uuid
 from api.v1.auth.auth import Auth
+from api.v1.auth.session_store import SessionStore
 from models.user import User
 
 
 class SessionAuth(Auth):
     """ SessionAuth class.
     """
-    user_id_by_session_id = {}
+
+    def __init__(self):
+        """
+        Initialize the SessionAuth instance with an empty session store.
+        """
+        super().__init__()
+        self.user_id_by_session_id = SessionStore()
 
     def create_session(self, user_id: str = None) -> str:
         """
@@ -27,7 +34,7 @@ class SessionAuth(Auth):
             return None
 
         session_id = str(uuid.uuid4())
-        self.user_id_by_session_id[session_id] = user_id
+        self.user_id_by_session_id.put(session_id, user_id)
         return session_id
 
     def user_id_for_session_id(self, session_id: str = None) -> str:
@@ -66,9 +73,8 @@ class SessionAuth(Auth):
         if session_id is None:
             return False
 
-        user_id = self.user_id_for_session_id(session_id)
-        if user_id is None:
+        if self.user_id_for_session_id(session_id) is None:
             return False
 
-        self.user_id_by_session_id.pop(session_id, None)
+        self.user_id_by_session_id.pop(session_id)
         return True
@@ -6,16 +6,60 @@ with database storage.
 
 from api.v1.auth.session_exp_auth import SessionExpAuth
 from models.user_session import UserSession
-from datetime import datetime
-from flask import request
+from datetime import datetime, timedelta
+from typing import Tuple
+import os
+import threading
+import time
+import uuid
+import weakref
+
+
+def _sweep_forever(ref: weakref.ref, interval: float,
+                   stopped: threading.Event):
+    """
+    Body of the sweeper thread: purge the expired sessions every
+    interval seconds until the auth is closed or garbage collected.
+    """
+    while not stopped.wait(interval):
+        auth = ref()
+        if auth is None:
+            return
+        auth.purge_expired()
+        del auth
 
 
 class SessionDBAuth(SessionExpAuth):
     """
     SessionDBAuth class for session authentication with
     database storage.
+
+    Sessions are only kept as UserSession rows, found through the
+    session_id hash index of UserSession and persisted by its write-behind
+    storage, which batches the creates and deletes of a burst into one
+    write of .db_UserSession.json. They expire SESSION_DURATION
+    seconds after their stored created_at. Expired rows are purged
+    every SESSION_SWEEP_INTERVAL seconds (300 by default, 0 disables
+    the sweeper thread).
     """
 
+    def __init__(self):
+        """
+        Initialize the SessionDBAuth instance, load the stored sessions
+        and start the sweeper thread.
+        """
+        super().__init__()
+        UserSession.load_from_file()
+        self.sweep_interval = float(os.getenv('SESSION_SWEEP_INTERVAL', 300))
+        self.stopped = threading.Event()
+        self.sweeper = None
+        if self.session_duration > 0 and self.sweep_interval > 0:
+            self.sweeper = threading.Thread(
+                target=_sweep_forever,
+                args=(weakref.ref(self), self.sweep_interval, self.stopped),
+                name='SessionDBAuth-sweeper', daemon=True)
+            self.sweeper.start()
+
     def create_session(self, user_id=None):
         """
         Create a session for the specified user ID and store it in the database
@@ -26,14 +70,29 @@ class SessionDBAuth(SessionExpAuth):
         Returns:
             str: The session ID created for the user, or None if creation fails
         """
-        session_id = super().create_session(user_id)
-        if not session_id:
+        if user_id is None or not isinstance(user_id, str):
             return None
 
-        new_session = UserSession(user_id=user_id, session_id=session_id)
-        new_session.save()
+        session_id = str(uuid.uuid4())
+        UserSession(user_id=user_id, session_id=session_id).save()
         return session_id
 
+    def user_session(self, session_id=None):
+        """
+        Retrieve the stored session with a session ID.
+
+        Args:
+            session_id (str): The session ID.
+
+        Returns:
+            UserSession: The session, or None if not found.
+        """
+        if session_id is None or not isinstance(session_id, str):
+            return None
+
+        sessions = UserSession.search({'session_id': session_id}, 1)
+        return sessions[0] if sessions else None
+
     def user_id_for_session_id(self, session_id=None):
         """
         Retrieve the user ID associated with a session ID from the database.
@@ -45,15 +104,19 @@ class SessionDBAuth(SessionExpAuth):
             str: The user ID associated with the session ID, or None
             if not found or expired.
         """
-        if session_id is None:
+        session = self.user_session(session_id)
+        if session is None:
             return None
 
-        session = UserSession.search({'session_id': session_id})
-        if not session:
+        if self.session_duration <= 0:
+            return session.user_id
+
+        expiration_time = session.created_at + timedelta(
+                seconds=self.session_duration)
+        if datetime.utcnow() > expiration_time:
             return None
 
-        session = session[0]
-        return super().user_id_for_session_id(session_id)
+        return session.user_id
 
     def destroy_session(self, request=None):
         """
@@ -62,12 +125,54 @@ class SessionDBAuth(SessionExpAuth):
         Args:
             request: The request object containing the session ID
             in the cookies.
+
+        Returns:
+            bool: True if a session was destroyed, False otherwise.
         """
         if request is None:
-            return
+            return False
+
+        session = self.user_session(self.session_cookie(request))
+        if session is None:
+            return False
+
+        session.remove()
+        return True
+
+    def purge_expired(self) -> Tuple[int, float]:
+        """
+        Remove every expired session from the database in one pass.
+
+        The expired rows are found through the created_at sorted index
+        of UserSession and their removal is persisted with one write.
+
+        Returns:
+            tuple: The number of sessions removed and the duration of
+            the pass in seconds.
+        """
+        if self.session_duration <= 0:
+            return 0, 0.0
+
+        start = time.perf_counter()
+        cutoff = datetime.utcnow().replace(microsecond=0) - timedelta(
+                seconds=self.session_duration)
+        expired = UserSession.search({'created_at__lt': cutoff})
+        purged = UserSession.remove_many(expired)
+        return purged, time.perf_counter() - start
+
+    def close(self):
+        """
+        Stop the sweeper thread.
+        """
+        self.stopped.set()
+
 
-        session_id = request.cookies.get(self.session_name)
-        if session_id:
-            sessions = UserSession.search({'session_id': session_id})
-            for session in sessions:
-                session.remove()
+if __name__ == "__main__":
+    auth = SessionDBAuth()
+    auth.close()
+    if auth.session_duration <= 0:
+        print("SESSION_DURATION is not set, sessions never expire")
+    else:
+        purged, elapsed = auth.purge_expired()
+        print("Purged {} expired sessions in {:.3f}s".format(
+            purged, elapsed))
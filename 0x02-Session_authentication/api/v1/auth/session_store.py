@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+In-memory session store used by SessionAuth and its subclasses.
+"""
+
+from collections import OrderedDict
+from heapq import heapify, heappop, heappush
+from typing import Dict, Optional
+import os
+import threading
+import time
+import weakref
+
+
+class _Shard:
+    """
+    One lock-striped slice of a SessionStore.
+
+    entries maps a session ID to (user_id, expires_at) in least to most
+    recently used order. heap holds (expires_at, session_id) for every
+    session with a lifetime; entries that were since destroyed or
+    recreated stay in it until they reach the top and are skipped.
+    """
+
+    __slots__ = ('lock', 'entries', 'heap')
+
+    def __init__(self):
+        """
+        Initialize an empty shard.
+        """
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.heap = []
+
+    def expire(self, now: float) -> int:
+        """
+        Drop the sessions that expired at or before now. The caller
+        holds the shard lock.
+
+        Args:
+            now (float): The current time.monotonic() value.
+
+        Returns:
+            int: The number of sessions dropped.
+        """
+        heap = self.heap
+        entries = self.entries
+        expired = 0
+        while heap and heap[0][0] <= now:
+            expires_at, session_id = heappop(heap)
+            entry = entries.get(session_id)
+            if entry is not None and entry[1] == expires_at:
+                del entries[session_id]
+                expired += 1
+        if len(heap) > 2 * len(entries) + 64:
+            self.heap = heap = [(entry[1], session_id)
+                                for session_id, entry in entries.items()
+                                if entry[1] is not None]
+            heapify(heap)
+        return expired
+
+
+def _reap_forever(ref: weakref.ref, interval: float,
+                  stopped: threading.Event):
+    """
+    Body of the reaper thread: expire sessions every interval seconds
+    until the store is closed or garbage collected.
+    """
+    while not stopped.wait(interval):
+        store = ref()
+        if store is None:
+            return
+        store.reap()
+        del store
+
+
+class SessionStore:
+    """
+    Thread-safe map of session IDs to user IDs.
+
+    Sessions are spread over independently locked shards. Each shard
+    keeps an expiry heap, so a background reaper thread removes expired
+    sessions in O(expired * log n) without scanning live ones, and an
+    LRU order that evicts the least recently used sessions once the
+    store is full.
+    """
+
+    def __init__(self, ttl: float = 0, max_size: int = None,
+                 shards: int = None, reap_interval: float = None):
+        """
+        Initialize an empty store.
+
+        Args:
+            ttl (float): Default lifetime of a session in seconds.
+            0 or less means sessions never expire.
+            max_size (int): Maximum number of sessions, from the
+            SESSION_STORE_SIZE environment variable by default (100000).
+            0 means unbounded. The cap is split evenly across shards.
+            shards (int): Number of shards, from the SESSION_STORE_SHARDS
+            environment variable by default (16).
+            reap_interval (float): Seconds between two runs of the
+            reaper thread, from the SESSION_REAP_INTERVAL environment
+            variable by default (60). 0 disables the thread; expired
+            sessions are then only dropped when they are looked up or
+            when a new session lands in their shard.
+        """
+        if max_size is None:
+            max_size = int(os.getenv('SESSION_STORE_SIZE', 100000))
+        if shards is None:
+            shards = int(os.getenv('SESSION_STORE_SHARDS', 16))
+        if reap_interval is None:
+            reap_interval = float(os.getenv('SESSION_REAP_INTERVAL', 60))
+        shards = max(1, shards)
+        self.ttl = ttl
+        self.max_size = max(0, max_size)
+        self.shard_size = -(-self.max_size // shards)
+        self.shards = tuple(_Shard() for _ in range(shards))
+        self.reap_interval = reap_interval
+        self.reaper = None
+        self.reaper_lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def _shard(self, session_id: str) -> _Shard:
+        """
+        Shard a session ID belongs to.
+        """
+        return self.shards[hash(session_id) % len(self.shards)]
+
+    def put(self, session_id: str, user_id: str, ttl: float = None):
+        """
+        Store or replace a session.
+
+        Args:
+            session_id (str): The session ID.
+            user_id (str): The user ID the session belongs to.
+            ttl (float): Lifetime of this session in seconds, the
+            store's default ttl if None.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        now = time.monotonic()
+        expires_at = now + ttl if ttl > 0 else None
+        shard = self._shard(session_id)
+        with shard.lock:
+            shard.entries[session_id] = (user_id, expires_at)
+            shard.entries.move_to_end(session_id)
+            if expires_at is not None:
+                heappush(shard.heap, (expires_at, session_id))
+                shard.expire(now)
+            if self.shard_size:
+                while len(shard.entries) > self.shard_size:
+                    shard.entries.popitem(last=False)
+        if expires_at is not None and self.reaper is None:
+            self._start_reaper()
+
+    def get(self, session_id: str, default: str = None) -> Optional[str]:
+        """
+        User ID of a live session, marking it as recently used.
+
+        Args:
+            session_id (str): The session ID.
+            default (str): Returned if the session is missing or expired.
+
+        Returns:
+            str: The user ID, or default.
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            entry = shard.entries.get(session_id)
+            if entry is None:
+                return default
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del shard.entries[session_id]
+                return default
+            shard.entries.move_to_end(session_id)
+            return entry[0]
+
+    def pop(self, session_id: str, default: str = None) -> Optional[str]:
+        """
+        Remove a session.
+
+        Args:
+            session_id (str): The session ID.
+            default (str): Returned if the session is missing or expired.
+
+        Returns:
+            str: The user ID the session belonged to, or default.
+        """
+        shard = self._shard(session_id)
+        with shard.lock:
+            entry = shard.entries.pop(session_id, None)
+        if entry is None or (entry[1] is not None and
+                             entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def reap(self) -> int:
+        """
+        Remove every expired session.
+
+        Returns:
+            int: The number of sessions removed.
+        """
+        now = time.monotonic()
+        expired = 0
+        for shard in self.shards:
+            with shard.lock:
+                expired += shard.expire(now)
+        return expired
+
+    def _start_reaper(self):
+        """
+        Start the background reaper thread once.
+        """
+        if self.reap_interval <= 0:
+            return
+        with self.reaper_lock:
+            if self.reaper is not None:
+                return
+            self.reaper = threading.Thread(
+                target=_reap_forever,
+                args=(weakref.ref(self), self.reap_interval, self.stopped),
+                name='SessionStore-reaper', daemon=True)
+        self.reaper.start()
+
+    def close(self):
+        """
+        Stop the reaper thread.
+        """
+        self.stopped.set()
+
+    def snapshot(self) -> Dict[str, str]:
+        """
+        Copy of the live sessions.
+
+        Returns:
+            dict: The user ID of each live session, by session ID.
+        """
+        now = time.monotonic()
+        sessions = {}
+        for shard in self.shards:
+            with shard.lock:
+                sessions.update(
+                    (session_id, entry[0])
+                    for session_id, entry in shard.entries.items()
+                    if entry[1] is None or entry[1] > now)
+        return sessions
+
+    def __len__(self) -> int:
+        """
+        Number of stored sessions, including expired ones the reaper
+        has not removed yet.
+        """
+        return sum(len(shard.entries) for shard in self.shards)
+
+    def __contains__(self, session_id: str) -> bool:
+        """
+        Whether a session is live.
+        """
+        return self.get(session_id) is not None
+
+    def __getitem__(self, session_id: str) -> str:
+        """
+        User ID of a live session.
+        """
+        user_id = self.get(session_id)
+        if user_id is None:
+            raise KeyError(session_id)
+        return user_id
+
+    def __setitem__(self, session_id: str, user_id: str):
+        """
+        Store a session with the default ttl.
+        """
+        self.put(session_id, user_id)
+
+    def __delitem__(self, session_id: str):
+        """
+        Remove a session.
+        """
+        if self.pop(session_id) is None:
+            raise KeyError(session_id)
+
+    def __repr__(self) -> str:
+        """
+        Live sessions, formatted like a dict.
+        """
+        return repr(self.snapshot())
@@ -2,18 +2,80 @@
 """ Module of Users views
 """
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request, url_for
+from models.base import dumps_json
 from models.user import User
+from typing import Iterator, List
+
+
+NDJSON = 'application/x-ndjson'
+STREAM_BATCH_SIZE = 1000
+
+
+def json_response(data) -> Response:
+    """ JSON response encoded with the model encoder
+    """
+    return Response(dumps_json(data), mimetype='application/json')
+
+
+def stream_users(after: str = None, limit: int = None,
+                 fields: List[str] = None) -> Iterator[bytes]:
+    """ Users in ID order as JSON lines, serialized one batch at a time
+    """
+    sent = 0
+    while limit is None or sent < limit:
+        size = STREAM_BATCH_SIZE
+        if limit is not None:
+            size = min(size, limit - sent)
+        users = User.page(after, size)
+        if not users:
+            return
+        yield b''.join(dumps_json(user) + b'\n'
+                       for user in User.to_json_many(users, only=fields))
+        sent += len(users)
+        after = users[-1].id
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (all optional):
+      - limit: maximum number of users, in ID order
+      - after: ID of the last user of the previous page
+      - fields: comma-separated fields to return
+      - format=ndjson (or Accept: application/x-ndjson): stream the
+        users as JSON lines
     Return:
       - list of all User objects JSON represented
+      - Link header to the next page when the page is full
+      - 400 if limit isn't a positive integer
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit <= 0:
+            return jsonify({'error': "Wrong limit"}), 400
+    after = request.args.get('after')
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [field.strip() for field in fields.split(',')]
+
+    if request.args.get('format') == 'ndjson' or \
+            request.accept_mimetypes.best == NDJSON:
+        return Response(stream_users(after, limit, fields), mimetype=NDJSON)
+    if limit is None and after is None:
+        users = User.all()
+    else:
+        users = User.page(after, limit)
+    response = json_response(User.to_json_many(users, only=fields))
+    if limit is not None and len(users) == limit:
+        response.headers['Link'] = '<{}>; rel="next"'.format(url_for(
+            'app_views.view_all_users', limit=limit, after=users[-1].id,
+            fields=request.args.get('fields')))
+    return response
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
@@ -31,13 +93,13 @@ def view_one_user(user_id: str = None) -> str:
         if request.current_user is None:
             abort(404)
         else:
-            return jsonify(request.current_user.to_json())
+            return json_response(request.current_user.to_json())
 
     user = User.get(user_id)
     if user is None:
         abort(404)
 
-    return jsonify(user.to_json())
+    return json_response(user.to_json())
 
 
 @app_views.route('/users/<user_id>', methods=['DELETE'], strict_slashes=False)
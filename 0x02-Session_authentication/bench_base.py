@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+""" Benchmarks of models.base, run in a temporary directory
+
+    ./bench_base.py save [-n 100000] [-s file journal ...] [-t 120]
+        sequential User.save() calls on each storage, then a reload. A
+        storage still saving after -t seconds is stopped there, with
+        the time of all the saves projected from its quadratic cost
+
+    ./bench_base.py memory [-n 100000]
+        tracemalloc size of users loaded in memory, without and with
+        the email index, against the former __dict__ representation
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from models import base
+from models.base import STORAGES, TIMESTAMP_FORMAT, _parse_timestamp
+from models.user import User
+
+
+class DictUser:
+    """ User as it was stored before __slots__: every attribute in the
+    __dict__ of the instance, and index buckets always a dict of IDs
+    """
+
+    def __init__(self, **kwargs):
+        """ Initialize a DictUser from its JSON dictionary
+        """
+        self.id = kwargs['id']
+        self.created_at = _parse_timestamp(kwargs['created_at'])
+        self.updated_at = _parse_timestamp(kwargs['updated_at'])
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+    def _index(self):
+        """ Add this object to the email index
+        """
+        INDEX.setdefault(self.email, {})[self.id] = None
+
+
+INDEX = {}
+
+
+def bench_save(name: str, count: int, time_limit: float):
+    """ Time count sequential User.save() calls on a fresh storage of a
+    kind, until they are all on disk, then the reload of the file
+    """
+    base.storage = STORAGES[name]()
+    User.load_from_file()
+    start = time.perf_counter()
+    deadline = start + time_limit
+    for i in range(count):
+        user = User(email='u{}@x.io'.format(i), first_name='Bob',
+                    last_name='Dylan')
+        user.password = 'pwd'
+        user.save()
+        if i % 100 == 99 and time.perf_counter() > deadline:
+            break
+    base.storage.close()
+    elapsed = time.perf_counter() - start
+    saved = i + 1
+
+    base.storage = STORAGES[name]()
+    start = time.perf_counter()
+    User.load_from_file()
+    reload_elapsed = time.perf_counter() - start
+    assert User.count() == saved
+    base.storage.close()
+    print("{:<12} {:>8} saves in {:>8.2f}s {:>10,.0f} saves/s"
+          " reload {:.2f}s".format(name, saved, elapsed, saved / elapsed,
+                                   reload_elapsed))
+    if saved < count:
+        projected = elapsed * (count / saved) ** 2
+        print("{:<12} stopped after {:g}s, {} saves would take ~{:,.0f}s"
+              " (~{:.1f}h)".format('', time_limit, count, projected,
+                                   projected / 3600))
+
+
+def user_lines(count: int) -> list:
+    """ JSON dictionaries of count users as .db_User.json stores them,
+    first and last names drawn from a few hundred
+    """
+    start = datetime(2024, 1, 1)
+    lines = []
+    for i in range(count):
+        created_at = (start + timedelta(seconds=i)).strftime(
+            TIMESTAMP_FORMAT)
+        lines.append(json.dumps({
+            'id': '{:08x}-0000-4000-8000-{:012x}'.format(i, i),
+            'created_at': created_at, 'updated_at': created_at,
+            'email': 'u{}@x.io'.format(i), '_password': '{:064x}'.format(i),
+            'first_name': 'First{}'.format(i % 300),
+            'last_name': 'Last{}'.format(i % 500)}))
+    return lines
+
+
+def bench_memory(cls, lines: list):
+    """ Bytes per user traced while building users of a class from their
+    JSON lines, then while indexing them by email
+    """
+    base.INDEXES.pop(cls.__name__, None)
+    INDEX.clear()
+    tracemalloc.start()
+    objs = {}
+    for line in lines:
+        obj = cls(**json.loads(line))
+        objs[obj.id] = obj
+    built = tracemalloc.get_traced_memory()[0]
+    for obj in objs.values():
+        obj._index()
+    indexed = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    count = len(lines)
+    print("{:<10} {:>6.0f} bytes/user without index {:>6.0f} with the"
+          " email index".format(cls.__name__, built / count,
+                                indexed / count))
+    base.INDEXES.pop(cls.__name__, None)
+    INDEX.clear()
+
+
+def main():
+    """ Run the benchmark named on the command line
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    save = commands.add_parser('save', help='sequential User.save() calls')
+    save.add_argument('-n', '--count', type=int, default=100000)
+    save.add_argument('-s', '--storages', nargs='+', choices=STORAGES,
+                      default=list(STORAGES))
+    save.add_argument('-t', '--time-limit', type=float, default=120,
+                      help='seconds after which a storage is stopped')
+    memory = commands.add_parser('memory', help='memory used by users')
+    memory.add_argument('-n', '--count', type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == 'memory':
+        lines = user_lines(args.count)
+        print("{} users".format(args.count))
+        for cls in (DictUser, User):
+            bench_memory(cls, lines)
+        return
+    cwd = os.getcwd()
+    for name in args.storages:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                bench_save(name, args.count, args.time_limit)
+            finally:
+                os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
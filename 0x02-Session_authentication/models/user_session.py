@@ -4,8 +4,6 @@ This module defines the UserSession model for storing session IDs
 in the database.
 """
 from models.base import Base
-from sqlalchemy import Column, String
-from sqlalchemy.orm import relationship
 
 
 class UserSession(Base):
@@ -14,10 +12,11 @@ class UserSession(Base):
     """
 
     __tablename__ = 'user_sessions'
-
-    id = Column(String(60), primary_key=True)
-    user_id = Column(String(60), nullable=False)
-    session_id = Column(String(60), nullable=False)
+    __slots__ = ('user_id', 'session_id')
+    __indexes__ = ('session_id', 'user_id')
+    __sorted_indexes__ = ('created_at',)
+    __interned__ = ('user_id',)
+    __storage__ = 'write_behind'
 
     def __init__(self, *args: list, **kwargs: dict):
         """
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+""" Tests for the locking and searching of models.base
+"""
+import json
+import random
+import sys
+import threading
+import time
+
+import pytest
+
+from models import base
+from models.base import (DATA, INDEXES, ORDERS, FileStorage, JournalStorage,
+                         STORAGES, RWLock, WriteBehindStorage, _index_get)
+from models.user import User
+
+
+def _run(*targets, timeout: float = 30):
+    """ Run functions in threads, return the exceptions they raised
+    """
+    errors = []
+
+    def wrap(target):
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=wrap, args=(t,), daemon=True)
+               for t in targets]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + timeout
+    for thread in threads:
+        thread.join(max(0, deadline - time.monotonic()))
+        assert not thread.is_alive(), "deadlock"
+    return errors
+
+
+def test_rwlock_readers_share():
+    lock = RWLock()
+    inside = threading.Barrier(3, timeout=5)
+
+    def reader():
+        with lock.read:
+            inside.wait()
+
+    assert _run(reader, reader, reader) == []
+
+
+@pytest.mark.parametrize("held", ["read", "write"])
+def test_rwlock_writer_excludes(held):
+    lock = RWLock()
+    entered = threading.Event()
+
+    def writer():
+        with lock.write:
+            entered.set()
+
+    with getattr(lock, held):
+        w = threading.Thread(target=writer, daemon=True)
+        w.start()
+        assert not entered.wait(0.1)
+    assert entered.wait(5)
+    w.join(5)
+
+
+def test_rwlock_readers_wait_for_writer():
+    lock = RWLock()
+    entered = threading.Event()
+
+    def reader():
+        with lock.read:
+            entered.set()
+
+    with lock.write:
+        r = threading.Thread(target=reader, daemon=True)
+        r.start()
+        assert not entered.wait(0.1)
+    assert entered.wait(5)
+    r.join(5)
+
+
+def test_rwlock_reentrant():
+    lock = RWLock()
+    with lock.write:
+        with lock.write:
+            with lock.read:
+                pass
+    with lock.read:
+        with lock.read:
+            pass
+    assert lock.writer is None and not lock.readers and not lock.waiting
+
+
+def test_rwlock_writer_preferred():
+    lock = RWLock()
+    order = []
+    lock.acquire_read()
+
+    def writer():
+        with lock.write:
+            order.append('writer')
+
+    def late_reader():
+        with lock.read:
+            order.append('reader')
+
+    w = threading.Thread(target=writer, daemon=True)
+    w.start()
+    deadline = time.monotonic() + 5
+    while not lock.waiting and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert lock.waiting
+    r = threading.Thread(target=late_reader, daemon=True)
+    r.start()
+    time.sleep(0.05)
+    assert order == []
+    lock.release_read()
+    w.join(5)
+    r.join(5)
+    assert order == ['writer', 'reader']
+
+
+@pytest.fixture(params=[FileStorage, JournalStorage, WriteBehindStorage])
+def storage(request, tmp_path, monkeypatch):
+    """ A fresh storage of each kind, working in a temporary directory
+    """
+    monkeypatch.chdir(tmp_path)
+    if request.param is WriteBehindStorage:
+        storage = WriteBehindStorage(interval_ms=5, max_ops=50)
+    else:
+        storage = request.param()
+    monkeypatch.setattr(base, 'storage', storage)
+    User.load_from_file()
+    yield storage
+    storage.close()
+
+
+def test_concurrent_readers_and_writers(storage):
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        _stress(storage)
+    finally:
+        sys.setswitchinterval(switch_interval)
+
+
+def _stress(storage):
+    """ Writers creating, updating and removing their own users while
+    readers list, search and serialize them all
+    """
+    ops = 60 if type(storage) is FileStorage else 400
+    done = threading.Event()
+    emails = {}
+
+    def writer(n):
+        def run():
+            rnd = random.Random(n)
+            mine = []
+            for i in range(ops):
+                action = rnd.random()
+                if action < 0.5 or not mine:
+                    user = User(email='w{}-{}@x.io'.format(n, i))
+                    user.save()
+                    mine.append(user)
+                elif action < 0.8:
+                    user = rnd.choice(mine)
+                    user.email = 'w{}-{}-moved@x.io'.format(n, i)
+                    user.save()
+                else:
+                    user = mine.pop(rnd.randrange(len(mine)))
+                    user.remove()
+            emails[n] = {user.id: user.email for user in mine}
+        return run
+
+    def reader():
+        while not done.is_set():
+            User.count()
+            User.page(limit=20)
+            users = User.search({'email__startswith': 'w1-'})
+            User.to_json_many(users)
+            for user in User.all()[:20]:
+                User.get(user.id)
+
+    def writers():
+        try:
+            assert _run(*(writer(n) for n in range(8))) == []
+        finally:
+            done.set()
+
+    assert _run(writers, reader, reader) == []
+    User.flush()
+
+    expected = {}
+    for mine in emails.values():
+        expected.update(mine)
+    assert set(DATA['User']) == set(expected)
+    assert [user.id for user in User.page()] == sorted(expected)
+    assert ORDERS.get('User') in (None, sorted(expected))
+    index = INDEXES['User']['email']
+    assert sum(len(_index_get(index, e)) for e in index) == len(expected)
+    for obj_id, email in expected.items():
+        assert [user.id for user in User.search({'email': email})] == \
+            [obj_id]
+
+    storage.close()
+    assert set(storage.load(User)) == set(expected)
+    if type(storage) is not JournalStorage:
+        with open(storage.file_path('User')) as f:
+            assert set(json.load(f)) == set(expected)
+
+
+@pytest.fixture(params=[(name, lazy)
+                        for name in ('file', 'journal', 'write_behind',
+                                     'sqlite')
+                        for lazy in (False, True)],
+                ids=lambda param: '{}-{}'.format(
+                    param[0], 'lazy' if param[1] else 'eager'))
+def saved_users(request, tmp_path, monkeypatch):
+    """ Users saved by a storage of each kind and reloaded from it, in
+    lazy and eager mode
+    """
+    name, lazy = request.param
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(base, 'storage', STORAGES[name]())
+    User.load_from_file()
+    users = []
+    for i in range(6):
+        user = User(email='u{}@x.io'.format(i))
+        user.password = 'pwd{}'.format(i % 3) if i < 5 else None
+        user.save()
+        users.append(user)
+    base.storage.close()
+    monkeypatch.setattr(base, 'LAZY_LOAD', lazy)
+    monkeypatch.setattr(base, 'storage', STORAGES[name]())
+    User.load_from_file()
+    yield users
+    base.storage.close()
+
+
+def test_search_on_property_matches_across_storages(saved_users):
+    def ids(attributes):
+        return sorted(user.id for user in User.search(attributes))
+
+    u = saved_users
+    assert ids({'password': u[1].password}) == sorted([u[1].id, u[4].id])
+    assert ids({'password': u[1].password, 'email': 'u4@x.io'}) == \
+        [u[4].id]
+    assert ids({'password': u[1].password, 'email': 'u2@x.io'}) == []
+    assert ids({'password__in': [u[0].password, u[2].password]}) == \
+        sorted([u[0].id, u[2].id, u[3].id])
+    assert ids({'password__startswith': u[2].password[:12]}) == [u[2].id]
+    assert ids({'password': None}) == [u[5].id]
+    assert ids({'_password': u[0].password}) == sorted([u[0].id, u[3].id])
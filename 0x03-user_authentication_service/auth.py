@@ -2,11 +2,86 @@
 """takes in a password string arguments and returns bytes"""
 
 import bcrypt
+import os
+import time
 import uuid
+from functools import lru_cache
+from typing import Union
 from db import DB
 from user import Base, User
 
 
+BCRYPT_ROUNDS = 12
+BCRYPT_MIN_ROUNDS = 4
+BCRYPT_MAX_ROUNDS = 31
+
+
+def _calibrate_rounds(target_ms: float, min_rounds: int = BCRYPT_MIN_ROUNDS,
+                      max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """
+    Find the highest bcrypt cost factor whose verify time on this host
+    stays within target_ms milliseconds.
+
+    Each extra round doubles the work, so rounds are timed upwards from
+    min_rounds until one goes over the budget.
+    """
+    password = b"calibration"
+    rounds = min_rounds
+    while rounds < max_rounds:
+        hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds + 1))
+        start = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        if (time.perf_counter() - start) * 1000 > target_ms:
+            break
+        rounds += 1
+    return rounds
+
+
+@lru_cache(maxsize=1)
+def _bcrypt_rounds() -> int:
+    """
+    The cost factor of new hashes: calibrated against BCRYPT_TARGET_MS
+    when it is set, else BCRYPT_ROUNDS, else bcrypt's default.
+    """
+    target_ms = os.getenv("BCRYPT_TARGET_MS")
+    if target_ms:
+        return _calibrate_rounds(float(target_ms))
+    return int(os.getenv("BCRYPT_ROUNDS", BCRYPT_ROUNDS))
+
+
+def _rounds_pinned() -> bool:
+    """
+    Tell whether the cost factor is pinned with BCRYPT_ROUNDS rather
+    than calibrated with BCRYPT_TARGET_MS.
+    """
+    return (not os.getenv("BCRYPT_TARGET_MS") and
+            os.getenv("BCRYPT_ROUNDS") is not None)
+
+
+def _needs_rehash(hashed_password: Union[bytes, str]) -> bool:
+    """
+    Tell whether a hash should be replaced on a successful login: when
+    it is weaker than the calibrated cost factor, or differs from the
+    one pinned with BCRYPT_ROUNDS. Calibrated costs vary between hosts
+    with timing noise, so they are never enforced downwards.
+
+    Args:
+        hashed_password (bytes): The stored hash.
+
+    Returns:
+        bool: True if the password should be hashed again.
+    """
+    if isinstance(hashed_password, str):
+        hashed_password = hashed_password.encode('utf-8')
+    try:
+        cost = int(hashed_password.split(b'$')[2])
+    except (IndexError, ValueError):
+        return True
+    if _rounds_pinned():
+        return cost != _bcrypt_rounds()
+    return cost < _bcrypt_rounds()
+
+
 def _hash_password(password: str) -> bytes:
     """
     Hashes the input password using bcrypt.
@@ -18,7 +93,7 @@ def _hash_password(password: str) -> bytes:
         bytes: The salted hash of the input password.
     """
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=_bcrypt_rounds())
     hashed = bcrypt.hashpw(password_bytes, salt)
     return hashed
 
@@ -38,7 +113,12 @@ class Auth:
     """
 
     def __init__(self):
+        """
+        Open the database and settle the bcrypt cost factor, so that
+        calibration runs at startup and not inside the first login.
+        """
         self._db = DB()
+        _bcrypt_rounds()
 
     def register_user(self, email: str, password: str) -> User:
         """
@@ -66,6 +146,8 @@ class Auth:
         """
         Validate the user's login credentials.
 
+        A hash made with an outdated cost factor is replaced on success.
+
         Args:
             email (str): The email address of the user.
             password (str): The password of the user.
@@ -79,6 +161,9 @@ class Auth:
             hashed_password = user.hashed_password
             user_pass = password.encode('utf-8')
             if bcrypt.checkpw(user_pass, hashed_password):
+                if _needs_rehash(hashed_password):
+                    self._db.update_user(
+                        user.id, hashed_password=_hash_password(password))
                 return True
         return False
 
@@ -4,6 +4,17 @@ This module function returns the log message obfuscated
 """
 
 import re
+from functools import lru_cache
+
+
+@lru_cache(maxsize=128)
+def _pattern(fields, separator):
+    """
+    Compile the pattern matching the given fields, once per
+    (fields, separator).
+    """
+    return re.compile(r'((?:{})=)([^{}]+)'.format(
+        '|'.join(fields), re.escape(separator)))
 
 
 def filter_datum(fields, redaction, message, separator):
@@ -20,6 +31,5 @@ def filter_datum(fields, redaction, message, separator):
     Returns:
     String: Log message with specified fields obfuscated.
     """
-    pattern = re.compile(r'({}=)([^;]+)'.format('|'.join(fields), re.escape(
-        separator)))
+    pattern = _pattern(tuple(fields), separator)
     return pattern.sub(r'\1' + redaction, message)